@@ -1,10 +1,51 @@
 import os
-from openai import OpenAI
+import random
+import threading
+import time
+
 from app.models.product import Product
+from app.utils.metrics import llm_calls, record_error, timed
+from app.utils.response_cache import response_cache
+from config import Config
+
+
+def retryable_errors():
+    """Transient OpenAI errors; the SDK is only imported once an LLM call fails"""
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    return (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+
+
+class LLMBusyError(Exception):
+    """Raised when no LLM slot frees up within LLM_QUEUE_TIMEOUT"""
+
+
+def create_llm_client():
+    """Pooled OpenAI client with explicit timeouts, or the offline fake"""
+    if Config.LLM_BACKEND == 'fake':
+        from app.utils.fake_llm import FakeOpenAI
+        return FakeOpenAI()
+
+    import httpx
+    from openai import OpenAI
+    return OpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        timeout=httpx.Timeout(Config.LLM_TIMEOUT, connect=Config.LLM_CONNECT_TIMEOUT),
+        max_retries=0,  # retried below with our own backoff
+        http_client=httpx.Client(limits=httpx.Limits(
+            max_connections=Config.LLM_MAX_CONCURRENCY,
+            max_keepalive_connections=Config.LLM_MAX_CONCURRENCY
+        ))
+    )
+
 
 class AIAssistant:
+    FALLBACK_MESSAGE = "يا هلا بيكي! نورتي Celia Fashion. قوليلي محتاجة مساعدة في إيه وأنا معاكي؟ 😊"
+
     def __init__(self):
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.model = Config.LLM_MODEL
+        self.slots = threading.BoundedSemaphore(Config.LLM_MAX_CONCURRENCY)
         self.system_prompt = """
         أنت مساعد ذكي لمتجر ملابس أونلاين اسمه "Celia Fashion Live".
         جمهورك: نساء في مصر.
@@ -23,21 +64,98 @@ class AIAssistant:
         3. ترشيح منتجات بناءً على (نوع الاستخدام، الذوق، المقاس، اللون، الموسم).
         """
 
+    @property
+    def client(self):
+        """Created on the first LLM call, so workers that never chat skip the SDK"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = create_llm_client()
+        return self._client
+
+    def build_messages(self, user_message, context=None):
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if context:
+            messages.append({"role": "system", "content": f"سياق المنتجات المتاحة: {context}"})
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def _create(self, messages, **kwargs):
+        """chat.completions.create with exponential backoff on transient errors"""
+        for attempt in range(Config.LLM_MAX_RETRIES + 1):
+            try:
+                # Streams are timed to the first byte; the tokens follow in the response
+                with timed('llm'):
+                    response = self.client.chat.completions.create(model=self.model, messages=messages, **kwargs)
+                llm_calls.inc(outcome='ok')
+                return response
+            except retryable_errors():
+                if attempt == Config.LLM_MAX_RETRIES:
+                    llm_calls.inc(outcome='failed')
+                    raise
+                llm_calls.inc(outcome='retried')
+                delay = Config.LLM_RETRY_BACKOFF * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay))
+            except Exception:
+                llm_calls.inc(outcome='failed')
+                raise
+
+    def _acquire(self):
+        with timed('llm.queue'):
+            acquired = self.slots.acquire(timeout=Config.LLM_QUEUE_TIMEOUT)
+        if not acquired:
+            llm_calls.inc(outcome='busy')
+            raise LLMBusyError("All LLM slots are busy")
+
+    def complete(self, messages, **kwargs):
+        """Blocking completion under the concurrency limit"""
+        self._acquire()
+        try:
+            response = self._create(messages, **kwargs)
+        finally:
+            self.slots.release()
+        return response.choices[0].message.content
+
+    def stream(self, messages, **kwargs):
+        """Yield content deltas; the slot is held until the stream is exhausted or closed"""
+        self._acquire()
+        try:
+            for chunk in self._create(messages, stream=True, **kwargs):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            self.slots.release()
+
     def get_response(self, user_message, context=None):
+        cached = response_cache.get('chat', user_message, semantic=True, context=context)
+        if cached is not None:
+            return cached
         try:
-            messages = [{"role": "system", "content": self.system_prompt}]
-            if context:
-                messages.append({"role": "system", "content": f"سياق المنتجات المتاحة: {context}"})
-            messages.append({"role": "user", "content": user_message})
-
-            response = self.client.chat.completions.create(
-                model="gpt-4.1-mini",
-                messages=messages,
-                temperature=0.7
-            )
-            return response.choices[0].message.content
+            response = self.complete(self.build_messages(user_message, context), temperature=0.7)
         except Exception as e:
             print(f"Error in AI Assistant: {e}")
-            return "يا هلا بيكي! نورتي Celia Fashion. قوليلي محتاجة مساعدة في إيه وأنا معاكي؟ 😊"
+            record_error('assistant')
+            return self.FALLBACK_MESSAGE
+        response_cache.set('chat', user_message, response, context=context)
+        return response
+
+    def stream_response(self, user_message, context=None):
+        """Stream the reply; falls back to the canned message if nothing was sent yet"""
+        cached = response_cache.get('chat', user_message, semantic=True, context=context)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        try:
+            for delta in self.stream(self.build_messages(user_message, context), temperature=0.7):
+                parts.append(delta)
+                yield delta
+            response_cache.set('chat', user_message, ''.join(parts), context=context)
+        except Exception as e:
+            print(f"Error in AI Assistant stream: {e}")
+            record_error('assistant')
+            if not parts:
+                yield self.FALLBACK_MESSAGE
 
 assistant = AIAssistant()
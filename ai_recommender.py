@@ -1,15 +1,145 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import pandas as pd
-import numpy as np
+import threading
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
 from app.models.product import Product, RecommendationCache
+from app.utils.similarity_index import SimilarityIndex
+from app.utils.cache import SingleFlight, TTLCache, invalidations
+from app.utils.collaborative import CoPurchaseMatrix
+from app.utils.rules_engine import RulesEngine
+from app.utils.metrics import record_error, timed
+from app.utils.precompute import precompute_recommendations, upsert_recommendation_cache
+from app.utils.serializers import fetch_products, query_products, serialize_rows
+from app.utils.trending import trending
 from app import db
+from config import Config
 
 class AIRecommender:
     """AI-powered product recommendation system using scikit-learn"""
     
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(stop_words='english')
+        self.index = SimilarityIndex(
+            feature_fn=self.get_product_features,
+            top_k=Config.SIMILARITY_TOP_K
+        )
+        self.index_path = Config.SIMILARITY_INDEX_PATH
+        # Product ids changed since the index was built; guarded by index.lock
+        self.pending_reindex = set()
+        # One full load/rebuild at a time; request threads wait for it rather
+        # than starting their own
+        self.index_lock = threading.RLock()
+        self.refresh_lock = threading.Lock()
+        self.rules = RulesEngine(Config.RECOMMENDATION_RULES)
+        self.copurchase = CoPurchaseMatrix(top_k=Config.COLLABORATIVE_TOP_K)
+        
+        # In-memory layer in front of the RecommendationCache table
+        self.memory_cache = TTLCache(
+            maxsize=Config.RECOMMENDATION_CACHE_SIZE if Config.CACHE_TYPE != 'null' else 0,
+            ttl=Config.CACHE_DEFAULT_TIMEOUT
+        )
+        # One computation per key at a time; concurrent misses wait for it
+        self.inflight = SingleFlight(timeout=Config.SINGLE_FLIGHT_TIMEOUT)
+        invalidations.subscribe('recommendations', self._invalidate_memory_cache)
+        invalidations.subscribe('catalog', self._on_catalog_change)
+    
+    def _on_catalog_change(self, product_id):
+        """A product changed in this or another worker"""
+        self.rules.mark_stale()
+        if product_id is None:
+            # Full reload on next lookup
+            self.index.build([])
+        else:
+            with self.index.lock:
+                self.pending_reindex.add(int(product_id))
+    
+    def _pending_snapshot(self):
+        """Ids queued so far: a build that reads the catalog after this covers them"""
+        with self.index.lock:
+            return set(self.pending_reindex)
+    
+    def _drop_pending(self, covered):
+        with self.index.lock:
+            self.pending_reindex -= covered
+    
+    def _invalidate_memory_cache(self, product_id):
+        if product_id is None:
+            self.memory_cache.clear()
+        else:
+            product_id = int(product_id)
+            self.memory_cache.delete_where(lambda key: key[0] == product_id)
+    
+    def catalog_fingerprint(self):
+        """Cheap (count, last update) pair used to detect a stale on-disk index"""
+        count, last_update = db.session.query(
+            func.count(Product.id), func.max(Product.updated_at)
+        ).execution_options(use_primary=True).one()
+        return (count, last_update.isoformat() if last_update else None)
+    
+    def load_index(self):
+        """Load the prebuilt index from disk at worker startup, rebuilding if stale"""
+        covered = self._pending_snapshot()
+        fingerprint = self.catalog_fingerprint()
+        if self.index.load(self.index_path) and self.index.fingerprint == fingerprint:
+            self._drop_pending(covered)
+            self.apply_pending()
+            return self.index
+        return self.rebuild_index(fingerprint)
+    
+    def preload_index(self):
+        """
+        Load the prebuilt index if it matches the catalog, for a gunicorn
+        master to share with its workers; never rebuilds (returns False
+        and leaves that to the first lookup).
+        """
+        if self.index.load(self.index_path) and self.index.fingerprint == self.catalog_fingerprint():
+            return True
+        self.index.build([])
+        return False
+    
+    def rebuild_index(self, fingerprint=None, workers=1):
+        """Rebuild the similarity index from the whole catalog and persist it"""
+        with self.index_lock:
+            # Changes queued before the catalog is read are in the new index;
+            # ones arriving during the build are re-applied on top of it
+            covered = self._pending_snapshot()
+            fingerprint = fingerprint or self.catalog_fingerprint()
+            products = Product.query.order_by(Product.id).execution_options(use_primary=True).all()
+            self.index.build(products, fingerprint=fingerprint, workers=workers)
+            self._drop_pending(covered)
+            self.index.save(self.index_path)
+        self.apply_pending()
+        return self.index
+    
+    def ensure_index(self):
+        if not self.index.is_built:
+            with self.index_lock:
+                if not self.index.is_built:
+                    self.load_index()
+        else:
+            self.apply_pending()
+        return self.index
+    
+    def apply_pending(self):
+        """Patch the index with products changed since it was built"""
+        with self.index.lock:
+            if not self.pending_reindex or not self.index.is_built:
+                return
+            changed, self.pending_reindex = self.pending_reindex, set()
+        try:
+            # Re-read committed rows from the primary, so replication lag
+            # cannot leave them stale
+            products = {
+                p.id: p for p in Product.query.filter(Product.id.in_(changed)).execution_options(use_primary=True)
+            }
+        except Exception:
+            with self.index.lock:
+                self.pending_reindex |= changed
+            raise
+        for product_id in changed:
+            if product_id in products:
+                self.index.upsert(products[product_id])
+            else:
+                self.index.remove(product_id)
     
     def get_product_features(self, product):
         """Extract features from a product for comparison"""
@@ -33,130 +163,174 @@ class AIRecommender:
         
         return ' '.join(features)
     
-    def recommend_by_rules(self, product, limit=4):
-        """Phase 1: Rules-based recommendations"""
-        recommendations = []
-        
-        # Rule 1: If product is a dress, recommend bags and shoes
-        if 'dress' in product.category.lower() or 'فستان' in product.name:
-            bags_shoes = Product.query.filter(
-                (Product.category.ilike('%bag%')) | 
-                (Product.category.ilike('%shoe%')) |
-                (Product.category.ilike('%شنطة%')) |
-                (Product.category.ilike('%جزمة%'))
-            ).limit(limit).all()
-            recommendations.extend(bags_shoes)
-            
-        # Rule 2: If color is black, recommend complementary colors
-        if product.color and product.color.lower() in ['black', 'أسود']:
-            complementary = Product.query.filter(
-                Product.color.in_(['white', 'red', 'gold', 'أبيض', 'أحمر', 'ذهبي'])
-            ).limit(limit).all()
-            recommendations.extend(complementary)
-            
-        # Rule 3: If Soiree/Evening, recommend accessories
-        if any(tag in (product.ai_tags or []) for tag in ['soiree', 'evening', 'سواريه']):
-            accessories = Product.query.filter(
-                Product.category.ilike('%accessory%') | Product.category.ilike('%إكسسوار%')
-            ).limit(limit).all()
-            recommendations.extend(accessories)
-            
-        return [p.to_dict() for p in recommendations[:limit]]
+    def recommend_by_rules(self, product, limit=4, fields='detail'):
+        """Phase 1: Rules-based recommendations (see Config.RECOMMENDATION_RULES)"""
+        return fetch_products(self.rules.evaluate(product, limit), fields)
+    
+    def compose_ids(self, product, limit):
+        """
+        Rule matches first, then similarity neighbours to fill up to `limit`.
+        Both stages are in memory; returns None if the product is not indexed
+        and no rule matched.
+        """
+        with timed('recommender.rules'):
+            recommended_ids = self.rules.evaluate(product, limit)
+        if len(recommended_ids) >= limit:
+            return recommended_ids
+        
+        with timed('recommender.similarity'):
+            neighbours = self.ensure_index().lookup(product.id, limit + len(recommended_ids))
+        if neighbours is None:
+            return recommended_ids or None
+        seen = set(recommended_ids)
+        recommended_ids += [nid for nid in neighbours if nid not in seen][:limit - len(recommended_ids)]
+        return recommended_ids
 
-    def recommend_by_similarity(self, product_id, limit=4):
+    def recommend_by_similarity(self, product_id, limit=4, fields='detail'):
         """
         Recommend products using cosine similarity
         Based on category, color, tags, and description
         """
-        # Get the target product
-        target_product = Product.query.get(product_id)
-        if not target_product:
-            return []
-
-        # Try rules-based first
-        rules_recommendations = self.recommend_by_rules(target_product, limit)
-        if len(rules_recommendations) >= limit:
-            return rules_recommendations
-            
+        invalidations.poll()
         
-        # Check cache first
-        cache = RecommendationCache.query.filter_by(product_id=product_id).first()
-        if cache and cache.recommended_ids:
-            # Return cached recommendations
-            products = Product.query.filter(Product.id.in_(cache.recommended_ids)).all()
-            return [p.to_dict() for p in products[:limit]]
-        
-        # Get the target product
-        target_product = Product.query.get(product_id)
-        if not target_product:
+        key = (product_id, limit, fields)
+        recommendations = self.memory_cache.get(key)
+        if recommendations is None:
+            recommendations = self.inflight.do(key, lambda: self._compute_and_cache(key))
+        return recommendations
+    
+    def _compute_and_cache(self, key):
+        recommendations = self._recommend_by_similarity(*key)
+        self.memory_cache.set(key, recommendations)
+        return recommendations
+    
+    def _recommend_by_similarity(self, product_id, limit=4, fields='detail'):
+        """
+        Uncached pipeline: cache table -> rules -> similarity -> category.
+        Round trips: 2 on a cache hit, 2 on the category fallback and 3 on a
+        miss (lookup, product fetch, cache write), plus the one-off loads of
+        the rules catalog / similarity index after a catalog change.
+        """
+        # Product and its cache row in one query; the product stays in the
+        # session identity map for the rest of the request
+        with timed('recommender.lookup'):
+            row = self.lookup_query(product_id).first()
+        if row is None:
             return []
+        target_product, cache = row
         
-        # Get all products except the target
-        all_products = Product.query.filter(Product.id != product_id).all()
-        
-        if not all_products:
-            return []
+        if cache and cache.recommended_ids:
+            with timed('recommender.fetch'):
+                return fetch_products(cache.recommended_ids[:limit], fields)
         
         try:
-            # Create feature strings for all products
-            product_list = [target_product] + all_products
-            features = [self.get_product_features(p) for p in product_list]
-            
-            # Create TF-IDF matrix
-            tfidf_matrix = self.vectorizer.fit_transform(features)
+            # Cache a full top-K list so every `limit` can be served from it
+            recommended_ids = self.compose_ids(target_product, max(limit, self.index.top_k))
+            if recommended_ids is None:
+                return self.recommend_by_category(product_id, limit, product=target_product, fields=fields)
             
-            # Calculate cosine similarity
-            cosine_similarities = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:]).flatten()
+            with timed('recommender.fetch'):
+                recommendations = fetch_products(recommended_ids[:limit], fields)
             
-            # Get indices of most similar products
-            similar_indices = cosine_similarities.argsort()[-limit:][::-1]
+            with timed('recommender.store'):
+                # Upsert: a worker computing the same product concurrently
+                # must not fail or leave a duplicate row
+                upsert_recommendation_cache([{'product_id': product_id, 'recommended_ids': recommended_ids}])
+                db.session.commit()
             
-            # Get recommended products
-            recommended_products = [all_products[i] for i in similar_indices]
-            recommended_ids = [p.id for p in recommended_products]
-            
-            # Cache the results
-            if cache:
-                cache.recommended_ids = recommended_ids
-            else:
-                cache = RecommendationCache(
-                    product_id=product_id,
-                    recommended_ids=recommended_ids
-                )
-                db.session.add(cache)
-            
-            db.session.commit()
-            
-            return [p.to_dict() for p in recommended_products]
+            return recommendations
             
         except Exception as e:
             print(f"Error in similarity recommendation: {e}")
+            record_error('recommender')
+            db.session.rollback()
             # Fallback to simple category-based recommendation
-            return self.recommend_by_category(product_id, limit)
+            return self.recommend_by_category(product_id, limit, fields=fields)
+    
+    def lookup_query(self, product_id):
+        """(Product, RecommendationCache or None) for one product"""
+        return db.session.query(Product, RecommendationCache).outerjoin(
+            RecommendationCache, RecommendationCache.product_id == Product.id
+        ).filter(Product.id == product_id)
+    
+    def recommend_collaborative(self, product_id, limit=4, fields='detail'):
+        """
+        "Customers also bought": co-purchase neighbours blended with TF-IDF
+        similarity. Products nobody has bought together yet fall back to
+        the content-based pipeline. Returns (recommendations, mode used).
+        """
+        invalidations.poll()
+        
+        with timed('recommender.copurchase'):
+            co_scores = dict(self.copurchase.ensure_built().neighbours(product_id))
+        if not co_scores:
+            return self.recommend_by_similarity(product_id, limit, fields), 'similarity'
+        
+        with timed('recommender.similarity'):
+            index = self.ensure_index()
+            candidates = set(co_scores)
+            candidates.update(index.lookup(product_id, self.index.top_k) or [])
+            if index.is_built:
+                # Drop products deleted since they were bought
+                candidates = {pid for pid in candidates if pid in index.positions}
+            similarity = index.scores(product_id, candidates)
+        
+        weight = Config.COLLABORATIVE_WEIGHT
+        ranked = sorted(
+            candidates,
+            key=lambda pid: (-(weight * co_scores.get(pid, 0.0) + (1 - weight) * similarity.get(pid, 0.0)), pid)
+        )
+        with timed('recommender.fetch'):
+            return fetch_products(ranked[:limit], fields), 'collaborative'
     
-    def recommend_by_category(self, product_id, limit=4):
+    def recommend_by_category(self, product_id, limit=4, product=None, fields='detail'):
         """Simple fallback: recommend products from the same category"""
-        product = Product.query.get(product_id)
+        # Served from the identity map if the product was loaded this request
+        product = product or db.session.get(Product, product_id)
         if not product:
             return []
         
-        similar = Product.query.filter(
+        with timed('recommender.category'):
+            similar = self.category_query(product, limit, fields).all()
+        
+        return serialize_rows(similar, fields)
+    
+    def category_query(self, product, limit=4, fields='detail'):
+        """Other products in the same category"""
+        return query_products(fields).filter(
             Product.category == product.category,
             Product.id != product.id
-        ).limit(limit).all()
-        
-        return [p.to_dict() for p in similar]
+        ).limit(limit)
     
-    def recommend_trending(self, limit=8):
-        """Get trending/featured products"""
-        trending = Product.query.filter_by(featured=True).limit(limit).all()
+    def recommend_trending(self, limit=8, fields='detail'):
+        """
+        Trending products by time-decayed views and orders (see TrendingEngine),
+        topped up with featured then newest products while data is sparse
+        """
+        ranked_ids = trending.top(limit)
+        key = ('trending', tuple(ranked_ids), limit, fields)
+        cached = self.memory_cache.get(key)
+        if cached is not None:
+            return cached
         
-        # If not enough featured products, get latest ones
-        if len(trending) < limit:
-            latest = Product.query.order_by(Product.created_at.desc()).limit(limit).all()
-            trending = list(set(trending + latest))[:limit]
+        items = fetch_products(ranked_ids, fields)
+        seen = {p['id'] for p in items}
+        for fallback in self.trending_fallback_queries(fields):
+            if len(items) >= limit:
+                break
+            rows = serialize_rows(fallback.limit(limit + len(seen)).all(), fields)
+            items += [p for p in rows if p['id'] not in seen][:limit - len(items)]
+            seen.update(p['id'] for p in items)
         
-        return [p.to_dict() for p in trending]
+        self.memory_cache.set(key, items)
+        return items
+    
+    def trending_fallback_queries(self, fields='detail'):
+        """Featured, then all products, newest first (callers add the limit)"""
+        return (
+            query_products(fields).filter_by(featured=True).order_by(Product.created_at.desc()),
+            query_products(fields).order_by(Product.created_at.desc()),
+        )
     
     def generate_product_description(self, name, category, tags=None):
         """
@@ -164,6 +338,7 @@ class AIRecommender:
         Includes SEO optimization and Egyptian market tone
         """
         from app.utils.ai_assistant import assistant
+        from app.utils.response_cache import response_cache
         
         prompt = f"""
         اكتب وصف لمنتج ملابس بالمواصفات دي:
@@ -178,25 +353,74 @@ class AIRecommender:
         4. مناسب للسوق المصري.
         """
         
+        # Identical name/category/tags always map to the same prompt
+        cached = response_cache.get('description', prompt)
+        if cached is not None:
+            return cached
+        
         try:
-            response = assistant.client.chat.completions.create(
-                model="gpt-4.1-mini",
-                messages=[
-                    {"role": "system", "content": "أنت خبير SEO وكتابة محتوى تسويقي لبراندات الموضة في مصر."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response.choices[0].message.content
+            description = assistant.complete([
+                {"role": "system", "content": "أنت خبير SEO وكتابة محتوى تسويقي لبراندات الموضة في مصر."},
+                {"role": "user", "content": prompt}
+            ])
+            response_cache.set('description', prompt, description)
+            return description
         except:
+            record_error('description')
             return f"{name} - قطعة مميزة من {category}، جودة عالية وتصميم يجنن هيخليكي متألقة في كل وقت."
     
     def clear_cache(self, product_id=None):
-        """Clear recommendation cache"""
-        if product_id:
-            RecommendationCache.query.filter_by(product_id=product_id).delete()
-        else:
-            RecommendationCache.query.delete()
+        """
+        Clear one product's cached recommendations. With no product_id the
+        whole table is recomputed in place rather than wiped, so requests
+        keep hitting warm rows instead of all missing at once.
+        """
+        if not product_id:
+            return self.refresh_cache()
+        
+        RecommendationCache.query.filter_by(product_id=product_id).delete()
         db.session.commit()
+        
+        # Drop in-memory entries in this and every other worker
+        invalidations.publish('recommendations', product_id)
+    
+    def refresh_cache(self, workers=1):
+        """
+        Batch-recompute every product's neighbours into RecommendationCache;
+        returns None without doing anything if a refresh is already running
+        """
+        if not self.refresh_lock.acquire(blocking=False):
+            return None
+        try:
+            return precompute_recommendations(self, workers=workers)
+        finally:
+            self.refresh_lock.release()
 
 # Global instance
 recommender = AIRecommender()
+
+@event.listens_for(Session, 'after_flush')
+def _collect_product_changes(session, flush_context):
+    changed = {obj.id for obj in session.new if isinstance(obj, Product)}
+    changed.update(obj.id for obj in session.deleted if isinstance(obj, Product))
+    changed.update(
+        obj.id for obj in session.dirty
+        if isinstance(obj, Product) and session.is_modified(obj, include_collections=False)
+    )
+    if changed:
+        session.info.setdefault('changed_product_ids', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_product_changes(session):
+    """
+    Broadcast product changes only once committed, so other workers re-read
+    the new rows (and rolled-back edits are never announced)
+    """
+    for product_id in sorted(session.info.pop('changed_product_ids', ())):
+        invalidations.publish('catalog', product_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_product_changes(session):
+    session.info.pop('changed_product_ids', None)
@@ -1,7 +1,19 @@
-from flask import Blueprint, jsonify, request
+import json
+import threading
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from app.utils.ai_recommender import recommender
 from app.utils.ai_assistant import assistant
-from app.models.product import Product
+from app.models.product import Order, Product, User
+from app import db
+from app.utils import auth
+from app.utils.assets import AssetError, asset_jobs, missing_tools, validate_upload
+from app.utils.database import router as db_router
+from app.utils.orders import OrderError, OrderLimitError, OrdersBusyError, OutOfStockError, order_service
+from app.utils.listing import product_listing
+from app.utils.response_cache import response_cache
+from app.utils.retrieval import retriever
+from app.utils.serializers import field_set, json_response
+from app.utils.trending import trending as trending_engine
 
 bp = Blueprint('ai', __name__, url_prefix='/api')
 
@@ -9,27 +21,106 @@ bp = Blueprint('ai', __name__, url_prefix='/api')
 def recommend(product_id):
     """Get AI-powered recommendations for a product"""
     limit = request.args.get('limit', 4, type=int)
+    fields = field_set(request.args.get('fields'))
+    mode = request.args.get('mode', 'similarity')
     
-    recommendations = recommender.recommend_by_similarity(product_id, limit=limit)
+    if mode == 'collaborative':
+        # "Customers also bought"; falls back to similarity without order data
+        recommendations, mode = recommender.recommend_collaborative(product_id, limit=limit, fields=fields)
+    else:
+        mode = 'similarity'
+        recommendations = recommender.recommend_by_similarity(product_id, limit=limit, fields=fields)
     
-    return jsonify({
+    return json_response({
         'product_id': product_id,
+        'mode': mode,
         'recommendations': recommendations,
         'count': len(recommendations)
     })
 
+@bp.route('/products')
+def products():
+    """Newest products as JSON, paginated with ?after=/?before= cursors"""
+    limit = min(request.args.get('limit', 12, type=int), 100)
+    
+    listing = product_listing.page(
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=limit
+    )
+    
+    return json_response(listing.to_dict())
+
 @bp.route('/trending')
 def trending():
     """Get trending/featured products"""
     limit = request.args.get('limit', 8, type=int)
+    fields = field_set(request.args.get('fields'))
     
-    trending_products = recommender.recommend_trending(limit=limit)
+    trending_products = recommender.recommend_trending(limit=limit, fields=fields)
     
-    return jsonify({
+    return json_response({
         'trending': trending_products,
         'count': len(trending_products)
     })
 
+@bp.route('/events/view/<int:product_id>', methods=['POST'])
+def track_view(product_id):
+    """Count a product page view for trending (sent with navigator.sendBeacon)"""
+    trending_engine.record_view(product_id)
+    return '', 204
+
+@bp.route('/login', methods=['POST'])
+def login():
+    """Sign in with email and password; the session cookie identifies the user from then on"""
+    data = request.get_json(silent=True) or {}
+    email, password = data.get('email'), data.get('password')
+    user = None
+    if email and password:
+        user = User.query.filter_by(email=email).execution_options(use_primary=True).first()
+    if user is None or not user.password_hash or not user.check_password(password):
+        return jsonify({'error': 'Invalid email or password'}), 401
+    auth.login(user)
+    return jsonify({'id': user.id, 'name': user.name})
+
+@bp.route('/logout', methods=['POST'])
+def logout():
+    auth.logout()
+    return '', 204
+
+@bp.route('/orders', methods=['POST'])
+@auth.login_required
+def place_order():
+    """Place an order for the signed-in user; stock for every item is reserved atomically or not at all"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        order = order_service.place(auth.current_user_id(), data.get('items'))
+    except OutOfStockError as e:
+        return jsonify({'error': str(e), 'product_ids': e.product_ids}), 409
+    except OrderLimitError as e:
+        return jsonify({'error': str(e)}), 429
+    except OrderError as e:
+        return jsonify({'error': str(e)}), 400
+    except OrdersBusyError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    
+    return jsonify(order.to_dict()), 201
+
+# Confirmation is server-side only: the payment flow calls order_service.confirm()
+
+@bp.route('/orders/<int:order_id>/cancel', methods=['POST'])
+@auth.login_required
+def cancel_order(order_id):
+    """Cancel one of the signed-in user's orders and return its stock"""
+    order = db.session.get(Order, order_id, execution_options={'use_primary': True})
+    # Same answer for someone else's order as for a missing one
+    if order is None or order.user_id != auth.current_user_id():
+        return jsonify({'error': 'Order not found'}), 404
+    if not order_service.cancel(order_id, order.user_id):
+        return jsonify({'error': 'Order cannot be cancelled'}), 409
+    return jsonify({'id': order_id, 'status': 'cancelled'})
+
 @bp.route('/generate-description', methods=['POST'])
 def generate_description():
     """Generate product description using AI"""
@@ -53,10 +144,84 @@ def clear_cache():
     """Clear recommendation cache (admin only)"""
     product_id = request.args.get('product_id', type=int)
     
-    recommender.clear_cache(product_id)
+    if product_id:
+        recommender.clear_cache(product_id)
+        return jsonify({
+            'message': 'Cache cleared successfully'
+        })
+    
+    if recommender.refresh_lock.locked():
+        return jsonify({
+            'message': 'Cache refresh already running'
+        }), 202
+    
+    # Full refresh recomputes the whole catalog; run it off the request thread
+    app = current_app._get_current_object()
+    
+    def refresh():
+        with app.app_context():
+            try:
+                recommender.refresh_cache()
+            except Exception as e:
+                print(f"Error refreshing recommendation cache: {e}")
+    
+    threading.Thread(target=refresh, daemon=True).start()
     
     return jsonify({
-        'message': 'Cache cleared successfully'
+        'message': 'Cache refresh started'
+    }), 202
+
+@bp.route('/products/<int:product_id>/assets', methods=['POST'])
+@auth.admin_required
+def upload_assets(product_id):
+    """Upload a GLB model, thumbnail and textures (texture_<name>); variants are built in the background"""
+    if db.session.get(Product, product_id, execution_options={'use_primary': True}) is None:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    files = request.files
+    model = files.get('model')
+    thumbnail = files.get('thumbnail')
+    textures = {
+        name[len('texture_'):]: upload
+        for name, upload in files.items() if name.startswith('texture_')
+    }
+    if model is None and thumbnail is None and not textures:
+        return jsonify({'error': 'No asset files uploaded'}), 400
+    
+    # Reject bad files now rather than in the background job
+    try:
+        if model is not None:
+            validate_upload(model.stream, 'model')
+        for upload in [thumbnail, *textures.values()]:
+            if upload is not None:
+                validate_upload(upload.stream, 'image')
+    except AssetError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    queued = asset_jobs.submit(
+        current_app._get_current_object(), product_id, model=model, thumbnail=thumbnail, textures=textures
+    )
+    if not queued:
+        return jsonify({'error': 'Asset processing queue is full, try again later'}), 503
+    
+    return jsonify({
+        'message': 'Asset processing started',
+        'warnings': missing_tools(model=model is not None, images=thumbnail is not None or bool(textures))
+    }), 202
+
+@bp.route('/cache-stats')
+def cache_stats():
+    """In-memory recommendation cache counters for this worker"""
+    return jsonify({
+        'recommendations': recommender.memory_cache.stats(),
+        'recommendations_in_flight': recommender.inflight.stats(),
+        'copurchase': recommender.copurchase.stats(),
+        'trending': trending_engine.stats(),
+        'rules': recommender.rules.stats(),
+        'database': db_router.stats(),
+        'orders': order_service.stats(),
+        'assets': asset_jobs.stats(),
+        'llm_responses': response_cache.stats()
     })
 
 @bp.route('/chat', methods=['POST'])
@@ -68,12 +233,39 @@ def chat():
     if not user_message:
         return jsonify({'error': 'Message is required'}), 400
     
-    # Get some products for context
-    products = Product.query.limit(5).all()
-    context = ", ".join([f"{p.name} ({p.price} LE)" for p in products])
+    # Products most relevant to the question, within the token budget
+    context, retrieval = retriever.build_context(user_message)
     
     response = assistant.get_response(user_message, context)
     
     return jsonify({
-        'response': response
-    })
+        'response': response,
+        'retrieval': retrieval
+    }), 200, {'Server-Timing': f"retrieval;dur={retrieval['retrieval_ms']}"}
+
+@bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """AI Assistant Chat, streamed as server-sent events"""
+    data = request.get_json()
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+    
+    # Products most relevant to the question, within the token budget
+    context, retrieval = retriever.build_context(user_message)
+    
+    def events():
+        for delta in assistant.stream_response(user_message, context):
+            yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'Server-Timing': f"retrieval;dur={retrieval['retrieval_ms']}"
+        }
+    )
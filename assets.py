@@ -0,0 +1,306 @@
+import hashlib
+import mimetypes
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from app import db
+from app.models.product import Product
+from app.utils.metrics import record_error
+from config import Config
+
+mimetypes.add_type('model/gltf-binary', '.glb')
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+class AssetError(ValueError):
+    """An uploaded asset could not be processed"""
+
+
+class LocalAssetStore:
+    """
+    Content-addressed files on local disk, standing in for Cloudinary.
+    Keys are "<sha256 prefix>.<ext>", so a URL never changes meaning and can
+    be cached forever; identical uploads are stored once.
+    """
+
+    def __init__(self, root, url_prefix='/assets'):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+
+    def put(self, data, ext):
+        key = f"{hashlib.sha256(data).hexdigest()[:24]}.{ext}"
+        path = self.path(key)
+        if not os.path.exists(path):
+            os.makedirs(self.root, exist_ok=True)
+            # A temp file per writer: workers may store the same key at once
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f'.{key}.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    os.fchmod(f.fileno(), 0o644)  # mkstemp creates 0600
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return f'{self.url_prefix}/{key}'
+
+    def path(self, key):
+        return os.path.join(self.root, os.path.basename(key))
+
+
+def validate_glb(data, size=None):
+    """Check the GLB header (magic, version 2, declared length); `size` defaults to len(data)"""
+    if len(data) < 12:
+        raise AssetError('model is not a GLB file')
+    magic, version, length = struct.unpack_from('<4sII', data)
+    if magic != b'glTF' or version != 2:
+        raise AssetError('model must be a binary glTF 2.0 (.glb) file')
+    if length != (len(data) if size is None else size):
+        raise AssetError('GLB file is truncated')
+
+
+def gltfpack_available():
+    return shutil.which(Config.GLTFPACK_PATH) is not None
+
+
+def simplify_glb(data, ratio):
+    """
+    Decimate to `ratio` of the triangles and meshopt-compress with gltfpack
+    (meshoptimizer). The viewer decodes EXT_meshopt_compression.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = os.path.join(tmp, 'in.glb'), os.path.join(tmp, 'out.glb')
+        with open(source, 'wb') as f:
+            f.write(data)
+        command = [Config.GLTFPACK_PATH, '-i', source, '-o', target, '-c']
+        if ratio < 1.0:
+            command += ['-si', str(ratio)]
+        result = subprocess.run(command, capture_output=True, text=True, timeout=300)
+        if result.returncode != 0:
+            raise AssetError(f"gltfpack failed: {result.stderr.strip() or result.stdout.strip()}")
+        with open(target, 'rb') as f:
+            return f.read()
+
+
+def pillow_available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _load_image(data):
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except Exception:
+        raise AssetError('image could not be decoded')
+    return image
+
+
+def resize_image(data, max_size, fmt='WEBP', quality=80):
+    """Downscale to fit `max_size` px; returns (bytes, ext) or None without Pillow"""
+    image = _load_image(data)
+    if image is None:
+        return None
+    image = image.copy()
+    image.thumbnail((max_size, max_size))
+    if fmt == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    out = BytesIO()
+    image.save(out, fmt, quality=quality, method=4)
+    return out.getvalue(), fmt.lower()
+
+
+def _image_ext(data):
+    for signature, ext in ((b'\x89PNG', 'png'), (b'\xff\xd8', 'jpg'), (b'RIFF', 'webp')):
+        if data.startswith(signature):
+            return ext
+    raise AssetError('images must be PNG, JPEG or WebP')
+
+
+def validate_upload(stream, kind):
+    """
+    Check an uploaded file before it is queued, reading only its header
+    (plus Pillow's verify() for images). `kind` is 'model' or 'image'.
+    """
+    header = stream.read(16)
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if kind == 'model':
+        validate_glb(header, size)
+        return
+    _image_ext(header)
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+    try:
+        with Image.open(stream) as image:
+            image.verify()
+    except Exception:
+        raise AssetError('image could not be decoded')
+    finally:
+        stream.seek(0)
+
+
+def missing_tools(model=False, images=False):
+    """Warnings for variants that will not be generated on this host"""
+    warnings = []
+    if model and not gltfpack_available():
+        warnings.append('gltfpack not installed; only the original model will be stored')
+    if images and not pillow_available():
+        warnings.append('Pillow not installed; only the original images will be stored')
+    return warnings
+
+
+class AssetPipeline:
+    """
+    Turns uploaded product assets into delivery variants:
+      - model: GLB levels of detail (Config.ASSET_MODEL_LODS), decimated and
+        meshopt-compressed by gltfpack when it is installed
+      - thumbnail: WebP downscales (Config.ASSET_THUMBNAIL_SIZES), via Pillow
+      - textures: capped at Config.ASSET_TEXTURE_MAX_SIZE, via Pillow
+    Without gltfpack/Pillow the original file is stored as the only variant.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def process_model(self, data):
+        validate_glb(data)
+        variants, warnings = {}, []
+        if not gltfpack_available():
+            warnings.append('gltfpack not installed; stored the original model only')
+            return {'lod0': self.store.put(data, 'glb')}, warnings
+        for level, ratio in sorted(Config.ASSET_MODEL_LODS.items()):
+            variants[level] = self.store.put(simplify_glb(data, ratio), 'glb')
+        return variants, warnings
+
+    def process_image(self, data, sizes):
+        ext = _image_ext(data)
+        variants = {}
+        for size in sizes:
+            resized = resize_image(data, size)
+            if resized is None:
+                return {'original': self.store.put(data, ext)}, ['Pillow not installed; stored the original image only']
+            variants[str(size)] = self.store.put(*resized)
+        return variants, []
+
+    def process(self, product, model=None, thumbnail=None, textures=None):
+        """Generate variants for the given uploads (bytes) and store their URLs on `product`"""
+        variants = dict(product.asset_variants or {})
+        warnings = []
+
+        if model is not None:
+            variants['model'], notes = self.process_model(model)
+            warnings += notes
+            product.model_3d_url = variants['model']['lod0']
+
+        if thumbnail is not None:
+            variants['thumbnail'], notes = self.process_image(thumbnail, Config.ASSET_THUMBNAIL_SIZES)
+            warnings += notes
+            # Largest variant is the default image
+            product.thumbnail_url = list(variants['thumbnail'].values())[-1]
+
+        if textures:
+            texture_urls = dict(product.texture_urls or {})
+            for name, data in textures.items():
+                resized, notes = self.process_image(data, (Config.ASSET_TEXTURE_MAX_SIZE,))
+                warnings += notes
+                texture_urls[name] = list(resized.values())[0]
+            product.texture_urls = texture_urls
+
+        product.asset_variants = variants
+        db.session.commit()
+        return {'variants': variants, 'warnings': warnings}
+
+
+class AssetJobs:
+    """
+    Bounded background processing of uploads: `workers` jobs run at once and
+    up to `max_pending` more wait. Uploads are spooled to disk until their
+    job runs, so queued jobs hold no file contents in memory.
+    """
+
+    def __init__(self, pipeline, workers=2, max_pending=8):
+        self.pipeline = pipeline
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='assets')
+        self.slots = threading.BoundedSemaphore(workers + max_pending)
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, app, product_id, model=None, thumbnail=None, textures=None):
+        """Queue uploads (werkzeug FileStorage); returns False, queueing nothing, when full"""
+        if not self.slots.acquire(blocking=False):
+            return False
+        spool = None
+        try:
+            spool = tempfile.mkdtemp(prefix='asset-upload-')
+            uploads = [('model', None, model), ('thumbnail', None, thumbnail)]
+            uploads += [('texture', name, upload) for name, upload in (textures or {}).items()]
+            paths = []
+            for i, (kind, name, upload) in enumerate(uploads):
+                if upload is not None:
+                    path = os.path.join(spool, str(i))
+                    upload.save(path)
+                    paths.append((kind, name, path))
+            self.executor.submit(self._run, app, product_id, spool, paths)
+        except BaseException:
+            if spool is not None:
+                shutil.rmtree(spool, ignore_errors=True)
+            self.slots.release()
+            raise
+        return True
+
+    def _run(self, app, product_id, spool, paths):
+        try:
+            with app.app_context():
+                try:
+                    product = db.session.get(Product, product_id)
+                    if product is None:
+                        return
+                    uploads = {'model': None, 'thumbnail': None, 'texture': {}}
+                    for kind, name, path in paths:
+                        with open(path, 'rb') as f:
+                            if kind == 'texture':
+                                uploads['texture'][name] = f.read()
+                            else:
+                                uploads[kind] = f.read()
+                    result = self.pipeline.process(
+                        product, model=uploads['model'], thumbnail=uploads['thumbnail'], textures=uploads['texture']
+                    )
+                    for warning in result['warnings']:
+                        print(f"Asset processing for product {product_id}: {warning}")
+                    self.completed += 1
+                except Exception as e:
+                    db.session.rollback()
+                    self.failed += 1
+                    record_error('assets')
+                    print(f"Error processing assets for product {product_id}: {e}")
+                finally:
+                    db.session.remove()
+        finally:
+            shutil.rmtree(spool, ignore_errors=True)
+            self.slots.release()
+
+    def stats(self):
+        return {'completed': self.completed, 'failed': self.failed}
+
+
+# Global instances
+asset_pipeline = AssetPipeline(LocalAssetStore(Config.ASSET_STORE_PATH, Config.ASSET_URL_PREFIX))
+asset_jobs = AssetJobs(asset_pipeline, workers=Config.ASSET_WORKERS, max_pending=Config.ASSET_MAX_PENDING)
@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+
+parser = argparse.ArgumentParser(description='Fail if an endpoint query plans a sequential scan')
+parser.add_argument('--database-url', default=os.environ.get('AUDIT_DATABASE_URL'),
+                    help='scratch database to seed and audit (default AUDIT_DATABASE_URL); '
+                         'without one the configured database is audited as is')
+parser.add_argument('--rows', type=int, default=50000,
+                    help='seed the scratch database up to this many products before auditing')
+args = parser.parse_args()
+
+if args.database_url:
+    if args.database_url == os.environ.get('DATABASE_URL'):
+        sys.exit('❌ --database-url is the configured DATABASE_URL; the audit seeds synthetic '
+                 'products, so point it at a scratch database')
+    # Before the app (and config) are imported; plans come from the scratch primary only
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ['DATABASE_REPLICA_URLS'] = ''
+
+from app import create_app
+from app.utils.query_audit import audit_query_plans, endpoint_queries
+
+app = create_app()
+with app.app_context():
+    if not args.database_url:
+        print('ℹ️  No scratch database given: auditing DATABASE_URL without seeding, '
+              'so plans on a small catalog may not reflect production')
+    failures = audit_query_plans(min_rows=args.rows if args.database_url else 0)
+    checked = len(endpoint_queries())
+    for label, tables in failures:
+        print(f"❌ {label}: sequential scan on {', '.join(tables)}")
+    if failures:
+        sys.exit(1)
+    print(f"✅ {checked} endpoint queries use indexes")
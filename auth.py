@@ -0,0 +1,42 @@
+import hmac
+from functools import wraps
+
+from flask import current_app, jsonify, request, session
+
+
+def current_user_id():
+    """Id of the signed-in user (Flask's signed session cookie), or None"""
+    return session.get('user_id')
+
+
+def login(user):
+    session.clear()
+    session['user_id'] = user.id
+
+
+def logout():
+    session.clear()
+
+
+def login_required(view):
+    """Reject anonymous requests with a 401"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_user_id() is None:
+            return jsonify({'error': 'Sign in required'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def admin_required(view):
+    """Require "Authorization: Bearer <ADMIN_TOKEN>"; without ADMIN_TOKEN the view is disabled"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('ADMIN_TOKEN')
+        if not token:
+            return jsonify({'error': 'Admin API is disabled (ADMIN_TOKEN is not set)'}), 403
+        expected = f'Bearer {token}'.encode()
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+            return jsonify({'error': 'Admin token required'}), 401
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+import tempfile
+
+parser = argparse.ArgumentParser(description='Load-test the storefront and API endpoints')
+parser.add_argument('--requests', type=int, default=200, help='measured requests per endpoint')
+parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients')
+parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per endpoint first')
+parser.add_argument('--only', nargs='*', help='scenario names, e.g. api.recommend main.search')
+parser.add_argument('--url', help='drive a running server instead of the app in-process (no query counts)')
+parser.add_argument('--results', default='instance/benchmarks', help='directory results are stored in')
+parser.add_argument('--max-regression', type=float, default=0.2,
+                    help='fail if p95/rps/queries are this much worse than the previous run')
+args = parser.parse_args()
+
+# Never call the real OpenAI API, and start every run with an empty LLM
+# response cache so /api/chat numbers are comparable between runs
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('RESPONSE_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'llm_responses.sqlite3'))
+
+from app import create_app
+from app.utils.loadtest import (
+    HTTPClient, InProcessClient, compare, latest_result, run_suite, save_result
+)
+
+app = create_app()
+with app.app_context():
+    client = HTTPClient(args.url) if args.url else InProcessClient(app)
+    result = run_suite(client, requests=args.requests, concurrency=args.concurrency,
+                       warmup=args.warmup, only=args.only)
+
+    print(f"{result['catalog_size']} products on {result['database']}, "
+          f"{args.requests} requests x {args.concurrency} clients")
+    print(f"  {'endpoint':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'queries':>8} {'errors':>7}")
+    for name, s in result['scenarios'].items():
+        queries = '-' if s['queries_per_request'] is None else s['queries_per_request']
+        print(f"  {name:<16} {s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9} "
+              f"{s['rps']:>8} {queries:>8} {s['errors']:>7}")
+
+    path = save_result(result, args.results)
+    print(f"✅ Saved {path}")
+
+    baseline = latest_result(args.results, result['catalog_size'], exclude=path)
+    if baseline is None:
+        sys.exit(0)
+    regressions = 0
+    print(f"Compared with {baseline['started_at']} ({baseline.get('revision') or 'unknown revision'}):")
+    for name, metric, before, after, regressed in compare(result, baseline, args.max_regression):
+        regressions += regressed
+        print(f"  {'❌' if regressed else '  '} {name:<16} {metric:<20} {before} -> {after}")
+    if regressions:
+        sys.exit(1)
@@ -0,0 +1,48 @@
+import argparse
+import json
+import time
+from app import create_app, db
+from app.models.product import Product
+from app.utils import serializers
+
+parser = argparse.ArgumentParser(description='Per-item cost of building product JSON, old path vs new')
+parser.add_argument('--rows', type=int, default=1000, help='products serialized per run')
+parser.add_argument('--repeat', type=int, default=20, help='runs per path (best run is reported)')
+args = parser.parse_args()
+
+
+def best_of(fn):
+    best = float('inf')
+    for _ in range(args.repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+app = create_app()
+with app.app_context():
+    ids = [pid for pid, in db.session.query(Product.id).order_by(Product.id).limit(args.rows)]
+    if not ids:
+        raise SystemExit('❌ No products; run seed_data.py or import_products.py first')
+
+    def orm_to_dict():
+        products = Product.query.filter(Product.id.in_(ids)).all()
+        return json.dumps([p.to_dict() for p in products], sort_keys=True)
+
+    def projected(fields):
+        return lambda: serializers.dumps(serializers.fetch_products(ids, fields))
+
+    paths = [
+        ('ORM + to_dict + json', orm_to_dict),
+        ('projection (detail) + fast encoder', projected('detail')),
+        ('projection (card) + fast encoder', projected('card')),
+    ]
+    encoder = 'orjson' if serializers.orjson is not None else 'stdlib json'
+    print(f"{len(ids)} products, best of {args.repeat} runs, encoder: {encoder}")
+    baseline = None
+    for label, fn in paths:
+        per_item = best_of(fn) / len(ids) * 1e6
+        baseline = baseline or per_item
+        print(f"  {label:<38} {per_item:8.2f} µs/item  ({baseline / per_item:.1f}x)")
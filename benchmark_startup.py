@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+parser = argparse.ArgumentParser(description='Measure cold worker startup (imports, create_app, first request)')
+parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to start')
+parser.add_argument('--path', default='/cart', help='first request served by each worker')
+parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 1500)),
+                    help='fail if the median startup (interpreter to first response) exceeds this')
+parser.add_argument('--preload', action='store_true', help='also time loading the prebuilt similarity index')
+parser.add_argument('--allow-heavy', action='store_true',
+                    help='do not fail when numpy/scikit-learn/openai are imported at startup')
+args = parser.parse_args()
+
+# Runs in each fresh interpreter, like a newly forked worker without preload
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+ready = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+from app.utils.startup import loaded_heavy_modules
+result = {
+    'create_app_ms': (ready - start) * 1000,
+    'first_request_ms': (served - ready) * 1000,
+    'status': response.status_code,
+    'heavy_modules': loaded_heavy_modules(),
+}
+if sys.argv[2] == '1':
+    from app.utils.startup import preload
+    result['index_loaded'] = preload(app)
+    result['preload_ms'] = (time.perf_counter() - served) * 1000
+print(json.dumps(result))
+'''
+
+os.environ.setdefault('LLM_BACKEND', 'fake')
+
+runs = []
+for _ in range(args.runs):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, args.path, '1' if args.preload else '0'],
+        capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    # Wall time includes interpreter startup; preload is reported separately
+    result['total_ms'] = (time.perf_counter() - started) * 1000 - result.get('preload_ms', 0)
+    runs.append(result)
+
+
+def median(key):
+    return round(statistics.median(r[key] for r in runs), 1)
+
+
+print(f"{args.runs} cold starts, first request {args.path} -> {runs[0]['status']}")
+print(f"  create_app     {median('create_app_ms'):>8} ms")
+print(f"  first request  {median('first_request_ms'):>8} ms")
+print(f"  total          {median('total_ms'):>8} ms  (budget {args.budget_ms:g} ms)")
+if args.preload:
+    print(f"  index preload  {median('preload_ms'):>8} ms  "
+          f"({'loaded' if runs[0]['index_loaded'] else 'no prebuilt index; run build_similarity_index.py'})")
+
+heavy = runs[0]['heavy_modules']
+print(f"  heavy modules at startup: {', '.join(heavy) or 'none'}")
+
+failed = False
+if median('total_ms') > args.budget_ms:
+    print(f"❌ Startup over budget by {median('total_ms') - args.budget_ms:.1f} ms")
+    failed = True
+if heavy and not args.allow_heavy:
+    print(f"❌ Imported at startup: {', '.join(heavy)}")
+    failed = True
+if failed:
+    sys.exit(1)
+print('✅ Startup within budget')
@@ -0,0 +1,10 @@
+import time
+from app import create_app
+from app.utils.ai_recommender import recommender
+
+app = create_app()
+with app.app_context():
+    started = time.perf_counter()
+    index = recommender.rebuild_index()
+    elapsed = time.perf_counter() - started
+    print(f"✅ Similarity index rebuilt: {len(index.ids)} products in {elapsed:.2f}s -> {recommender.index_path}")
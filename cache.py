@@ -0,0 +1,228 @@
+import fcntl
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+
+class TTLCache:
+    """Bounded in-process LRU cache with per-entry TTL and hit/miss counters"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Drop every entry whose key matches `predicate`"""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key: the first caller runs the
+    function, callers arriving while it runs wait and share its result
+    (or its exception). Per process; the database upsert covers the rest.
+    A caller that has waited `timeout` seconds (e.g. the leader is stuck
+    on a hung query) stops waiting and runs the function itself.
+    """
+
+    def __init__(self, timeout=10.0):
+        self.timeout = timeout
+        self._calls = {}  # key -> [done event, result, exception]
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = [threading.Event(), None, None]
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        done = call[0]
+        if not leader:
+            if not done.wait(self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                return fn()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = fn()
+            return call[1]
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            done.set()
+
+    def stats(self):
+        return {
+            'in_flight': len(self._calls),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'timeouts': self.timeouts
+        }
+
+
+class InvalidationLog:
+    """
+    Cross-worker invalidation via an append-only file on local disk.
+    Every gunicorn worker on the host tails the file and replays new entries
+    written by other processes (lines carry the writer's pid); an entry with
+    an empty key means "clear everything". When the file grows past
+    `max_bytes` it is rotated by renaming it under an flock, and readers
+    that see a new inode fall back to a full clear.
+    """
+
+    def __init__(self, path, poll_interval=1.0, max_bytes=1024 * 1024):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_bytes = max_bytes
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._next_poll = 0.0
+        self._inode, self._offset = self._stat()
+
+    def _stat(self):
+        """(inode, size) of the log, or (None, 0) if it does not exist yet"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def subscribe(self, channel, handler):
+        """Register `handler(key)`; key is None for a full clear"""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel, key=None):
+        """Apply locally right away and broadcast to the other workers"""
+        self._dispatch(channel, key)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = f"{os.getpid()}\t{channel}\t{'' if key is None else key}\n".encode('utf-8')
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                # Another writer rotated the file while we waited for the lock
+                if os.fstat(fd).st_ino != self._stat()[0]:
+                    continue
+                os.write(fd, line)
+                if os.fstat(fd).st_size > self.max_bytes:
+                    os.replace(self.path, f'{self.path}.1')
+                return
+            finally:
+                os.close(fd)
+
+    def poll(self, force=False):
+        """Replay entries written by other workers since the last poll"""
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return
+        with self._lock:
+            self._next_poll = now + self.poll_interval
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                return  # rotated away; the next file has a new inode
+            with f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self._inode:
+                    if self._inode is not None:
+                        # Rotated: entries since our last poll left with the old file
+                        for channel in self._handlers:
+                            self._dispatch(channel, None)
+                    self._inode, self._offset = st.st_ino, 0
+                if st.st_size <= self._offset:
+                    return
+                f.seek(self._offset)
+                chunk = f.read(st.st_size - self._offset)
+            # Only consume complete lines
+            consumed = chunk.rfind(b'\n') + 1
+            self._offset += consumed
+
+        pid = str(os.getpid())
+        for raw in chunk[:consumed].decode('utf-8').splitlines():
+            writer, channel, key = (raw.split('\t') + ['', ''])[:3]
+            if writer != pid:
+                self._dispatch(channel, key or None)
+
+    def _dispatch(self, channel, key):
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(key)
+            except Exception as e:
+                print(f"Error in cache invalidation handler: {e}")
+
+
+# Global instance shared by every in-process cache
+invalidations = InvalidationLog(Config.CACHE_INVALIDATION_PATH)
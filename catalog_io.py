@@ -0,0 +1,342 @@
+import csv
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models.product import Product, RecommendationCache
+from app.utils.cache import invalidations
+from config import Config
+
+FIELDS = [
+    'id', 'name', 'description', 'category', 'price', 'color', 'available_colors',
+    'model_3d_url', 'thumbnail_url', 'texture_urls', 'asset_variants', 'ai_tags', 'stock', 'featured'
+]
+JSON_FIELDS = {'available_colors': list, 'texture_urls': dict, 'asset_variants': dict, 'ai_tags': list}
+# NOT NULL columns a new product must have
+REQUIRED_FIELDS = ('name', 'category', 'price')
+
+
+class RowError(ValueError):
+    def __init__(self, line_no, message):
+        super().__init__(f"line {line_no}: {message}")
+        self.line_no = line_no
+
+
+def _format(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(path):
+    """Stream raw rows (dicts) from a CSV or JSONL file with their line numbers"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if _format(path) == 'jsonl':
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+        else:
+            for line_no, raw in enumerate(csv.DictReader(f), start=2):
+                yield line_no, raw
+
+
+def validate_row(line_no, raw):
+    """
+    Coerce a raw row into values for the columns it has, raising RowError if
+    invalid. New products need name, category and price; a row with an id
+    may carry only some columns (e.g. id,price) to update just those.
+    """
+    row = {'id': None}
+    for field in FIELDS:
+        if field in raw:
+            value = raw[field]
+            row[field] = None if value == '' else value
+
+    missing = [f for f in REQUIRED_FIELDS if row.get(f) is None]
+    if row['id'] is None and missing:
+        raise RowError(line_no, 'name, category and price are required for new products')
+    if any(f in row for f in missing):
+        raise RowError(line_no, f"{', '.join(f for f in missing if f in row)} must not be empty")
+
+    try:
+        row['id'] = int(row['id']) if row['id'] is not None else None
+        if 'price' in row:
+            row['price'] = float(row['price'])
+        if 'stock' in row:
+            row['stock'] = int(row['stock'] or 0)
+    except (TypeError, ValueError):
+        raise RowError(line_no, 'id/price/stock must be numbers')
+    if row.get('price', 0) < 0 or row.get('stock', 0) < 0:
+        raise RowError(line_no, 'price and stock must not be negative')
+
+    if 'featured' in row:
+        featured = row['featured']
+        if isinstance(featured, str):
+            featured = featured.strip().lower() in ('1', 'true', 'yes', 'y')
+        row['featured'] = bool(featured)
+
+    created_at = raw.get('created_at') or None
+    if isinstance(created_at, str):
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            raise RowError(line_no, 'created_at must be an ISO timestamp')
+    if created_at is not None:
+        row['created_at'] = created_at
+
+    for field, kind in JSON_FIELDS.items():
+        if field not in row:
+            continue
+        value = row[field]
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                if kind is not list or value.lstrip().startswith(('[', '{')):
+                    raise RowError(line_no, f'{field} must be a JSON {kind.__name__}')
+                # CSV convenience: "casual|summer|cotton"
+                value = [v.strip() for v in value.split('|') if v.strip()]
+        if value is not None and not isinstance(value, kind):
+            raise RowError(line_no, f'{field} must be a JSON {kind.__name__}')
+        row[field] = value
+
+    return row
+
+
+def dialect_insert(table=Product.__table__):
+    """Dialect insert() construct, which supports on_conflict_do_update"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    raise RuntimeError(f"Bulk upsert is not supported on {dialect}")
+
+
+def _by_columns(rows):
+    """Group rows by the columns they set; executemany needs one shape per statement"""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[tuple(sorted(row))].append(row)
+    return groups.items()
+
+
+def upsert_batch(rows):
+    """
+    Upsert one batch with executemany, writing only the columns each row
+    has. Complete rows with an id insert or update that product, rows
+    without one are inserted, and partial rows update existing products
+    (unknown ids are skipped). The last row wins when an id repeats.
+    Returns the affected product ids.
+    """
+    now = datetime.utcnow()
+    by_id, new_rows = {}, []
+    for row in rows:
+        row = dict(row, updated_at=now)
+        if row['id'] is None:
+            del row['id']
+            new_rows.append(dict(row, created_at=row.get('created_at') or now))
+        else:
+            # ON CONFLICT cannot touch the same row twice in one statement
+            by_id.pop(row['id'], None)
+            by_id[row['id']] = row
+    complete = [dict(r, created_at=r.get('created_at') or now)
+                for r in by_id.values() if all(f in r for f in REQUIRED_FIELDS)]
+    partial = [r for r in by_id.values() if not all(f in r for f in REQUIRED_FIELDS)]
+    ids = []
+
+    for columns, group in _by_columns(complete):
+        stmt = dialect_insert()
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['id'],
+            set_={c: stmt.excluded[c] for c in columns if c not in ('id', 'created_at')}
+        )
+        db.session.execute(stmt, group)
+        ids.extend(r['id'] for r in group)
+
+    if partial:
+        existing = set(db.session.scalars(
+            select(Product.id).where(Product.id.in_([r['id'] for r in partial]))
+        ))
+        partial = [r for r in partial if r['id'] in existing]
+        for columns, group in _by_columns(partial):
+            table = Product.__table__
+            stmt = update(table).where(table.c.id == bindparam('product_id')).values(
+                {c: bindparam(c) for c in columns if c not in ('id', 'created_at')}
+            )
+            db.session.execute(stmt, [dict(r, product_id=r['id']) for r in group])
+            ids.extend(r['id'] for r in group)
+
+    for _, group in _by_columns(new_rows):
+        result = db.session.execute(dialect_insert().returning(Product.__table__.c.id), group)
+        ids.extend(result.scalars().all())
+
+    # Cached neighbour lists of the changed products are no longer valid
+    RecommendationCache.query.filter(RecommendationCache.product_id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return ids
+
+
+def _sync_id_sequence():
+    """Explicit ids do not advance the Postgres serial; catch it up"""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('products', 'id'), "
+            "COALESCE((SELECT MAX(id) FROM products), 1))"
+        ))
+        db.session.commit()
+
+
+def _refresh_recommendations(changed_ids):
+    """Patch in-memory structures per product, or rebuild once for large loads"""
+    from app.utils.ai_recommender import recommender
+
+    if len(changed_ids) <= Config.IMPORT_INCREMENTAL_LIMIT:
+        for product_id in changed_ids:
+            invalidations.publish('catalog', product_id)
+            invalidations.publish('recommendations', product_id)
+        recommender.ensure_index()
+        if recommender.index.is_built:
+            recommender.index.fingerprint = recommender.catalog_fingerprint()
+            recommender.index.save(recommender.index_path)
+    else:
+        invalidations.publish('catalog')
+        invalidations.publish('recommendations')
+        recommender.rebuild_index()
+
+
+def import_rows(raw_rows, batch_size=1000):
+    """
+    Validate and upsert (line_no, raw dict) pairs in batches.
+    Returns a summary dict with counts, errors and throughput.
+    """
+    started = time.perf_counter()
+    batch, changed_ids, errors = [], [], []
+    processed = 0
+
+    def flush(batch):
+        ids = upsert_batch([row for _, row in batch])
+        written = set(ids)
+        for line_no, row in batch:
+            if row['id'] is not None and row['id'] not in written:
+                errors.append(str(RowError(line_no, f"product {row['id']} does not exist")))
+        changed_ids.extend(ids)
+
+    for line_no, raw in raw_rows:
+        processed += 1
+        try:
+            batch.append((line_no, validate_row(line_no, raw)))
+        except RowError as e:
+            errors.append(str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    _sync_id_sequence()
+    if changed_ids:
+        _refresh_recommendations(changed_ids)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'processed': processed,
+        'upserted': len(changed_ids),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(processed / elapsed, 1) if elapsed else 0.0
+    }
+
+
+def import_file(path, batch_size=1000):
+    return import_rows(read_rows(path), batch_size=batch_size)
+
+
+def export_file(path, batch_size=1000):
+    """Stream the catalog to CSV or JSONL without loading it into memory"""
+    started = time.perf_counter()
+    columns = [Product.__table__.c[f] for f in FIELDS + ['created_at']]
+    result = db.session.execute(
+        select(*columns).order_by(Product.id).execution_options(yield_per=batch_size)
+    )
+    jsonl = _format(path) == 'jsonl'
+    count = 0
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = None if jsonl else csv.DictWriter(f, fieldnames=FIELDS + ['created_at'])
+        if writer:
+            writer.writeheader()
+        for row in result:
+            values = dict(row._mapping)
+            values['created_at'] = values['created_at'].isoformat() if values['created_at'] else None
+            if jsonl:
+                f.write(json.dumps(values, ensure_ascii=False) + '\n')
+            else:
+                for field in JSON_FIELDS:
+                    if values[field] is not None:
+                        values[field] = json.dumps(values[field], ensure_ascii=False)
+                writer.writerow(values)
+            count += 1
+
+    elapsed = time.perf_counter() - started
+    return {
+        'exported': count,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(count / elapsed, 1) if elapsed else 0.0
+    }
+
+
+def synthetic_rows(count, seed=42):
+    """
+    Deterministic fake catalog with realistic cardinalities (many categories
+    and colours, ~2% featured) for load tests and query plan audits.
+    Yields (line_no, raw dict) pairs ready for import_rows/validate_row.
+    """
+    rng = random.Random(seed)
+    categories = [f'{base} {style}' for base in ('Dresses', 'Bags', 'Shoes', 'Casual', 'Accessories')
+                  for style in ('Classic', 'Modern', 'Summer', 'Winter', 'Evening', 'Office', 'Sport', 'Kids')]
+    colors = ['Black', 'White', 'Red', 'Gold', 'Blue', 'Green', 'Beige', 'Pink',
+              'Navy', 'Brown', 'Grey', 'Purple', 'Olive', 'Silver', 'Orange', 'Yellow']
+    tags = ['soiree', 'evening', 'casual', 'summer', 'winter', 'cotton', 'leather', 'linen', 'silk',
+            'elegant', 'office', 'sport', 'modest', 'oversized', 'slim', 'vintage', 'wedding', 'party']
+    started = datetime.utcnow() - timedelta(days=730)
+    for i in range(count):
+        category = rng.choice(categories)
+        yield i + 1, {
+            'name': f'{category} {rng.choice(colors)} #{i}',
+            'description': f'{category} piece in {rng.choice(tags)} style, quality fabric, item {i}.',
+            'category': category,
+            'price': round(rng.uniform(150, 3000), 2),
+            'color': rng.choice(colors),
+            'ai_tags': rng.sample(tags, 3),
+            'stock': rng.randint(0, 50),
+            'featured': rng.random() < 0.02,
+            'created_at': started + timedelta(minutes=rng.randint(0, 730 * 24 * 60)),
+        }
+
+
+def seed_catalog(min_rows, batch_size=5000):
+    """Top the products table up to `min_rows` synthetic rows and refresh statistics"""
+    existing = db.session.query(func.count(Product.id)).scalar()
+    batch = []
+    for line_no, raw in synthetic_rows(max(0, min_rows - existing), seed=existing):
+        batch.append(validate_row(line_no, raw))
+        if len(batch) >= batch_size:
+            upsert_batch(batch)
+            batch = []
+    if batch:
+        upsert_batch(batch)
+    _sync_id_sequence()
+
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('ANALYZE'))
+    return db.session.query(func.count(Product.id)).scalar() - existing
@@ -0,0 +1,181 @@
+import heapq
+import math
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.product import Order
+from app.utils.cache import invalidations
+
+# Orders in these states do not count as purchases
+EXCLUDED_STATUSES = ('cancelled', 'refunded', 'expired')
+
+
+def order_product_ids(products):
+    """Distinct product ids from an Order.products JSON list"""
+    ids = set()
+    for item in products or []:
+        try:
+            ids.add(int(item['product_id']))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return ids
+
+
+class CoPurchaseMatrix:
+    """
+    Sparse item-item co-occurrence counts over orders ("customers also
+    bought"), held in memory as {item: {other: count}}. Built once from the
+    orders table, then patched per committed order (and un-patched when an
+    order is cancelled, refunded or expires); top-K lists per item are
+    cached and recomputed only for items an order touched.
+    """
+
+    def __init__(self, top_k=20):
+        self.top_k = top_k
+        self.lock = threading.RLock()
+        self.pending_orders = set()
+        self.pending_released = set()
+        self.is_built = False
+        self._reset()
+        invalidations.subscribe('orders', self._on_order)
+        invalidations.subscribe('released_orders', self._on_released)
+
+    def _reset(self):
+        self.pairs = defaultdict(lambda: defaultdict(int))
+        self.item_orders = defaultdict(int)  # orders containing each item
+        self._top = {}
+
+    def _on_order(self, order_id):
+        if order_id is None:
+            self.is_built = False
+        else:
+            self.pending_orders.add(int(order_id))
+
+    def _on_released(self, order_id):
+        if order_id is None:
+            self.is_built = False
+        else:
+            self.pending_released.add(int(order_id))
+
+    def _apply(self, product_ids, sign=1):
+        for a in product_ids:
+            self.item_orders[a] += sign
+            self._top.pop(a, None)
+            for b in product_ids:
+                if a != b:
+                    self.pairs[a][b] += sign
+                    if self.pairs[a][b] <= 0:
+                        del self.pairs[a][b]
+            if self.item_orders[a] <= 0:
+                del self.item_orders[a]
+            if a in self.pairs and not self.pairs[a]:
+                del self.pairs[a]
+
+    def build(self, batch_size=1000):
+        """Stream every counted order into a fresh matrix"""
+        with self.lock:
+            self.pending_orders.clear()
+            self.pending_released.clear()
+            self._reset()
+            result = db.session.execute(
+                select(Order.products)
+                .where(Order.status.notin_(EXCLUDED_STATUSES))
+                .execution_options(yield_per=batch_size, use_primary=True)
+            )
+            for products, in result:
+                self._apply(order_product_ids(products))
+            self.is_built = True
+
+    def ensure_built(self):
+        """
+        Build on first use, then fold in orders committed since the last
+        lookup and take out the ones released since
+        """
+        if not self.is_built:
+            self.build()
+        elif self.pending_orders or self.pending_released:
+            with self.lock:
+                added, self.pending_orders = self.pending_orders, set()
+                released, self.pending_released = self.pending_released, set()
+                # Placed and released since the last fold: never counted
+                skipped = added & released
+                added -= skipped
+                released -= skipped
+                # Primary: a replica may not have the just-committed orders yet
+                if added:
+                    rows = db.session.query(Order.products).filter(
+                        Order.id.in_(added), Order.status.notin_(EXCLUDED_STATUSES)
+                    ).execution_options(use_primary=True).all()
+                    for products, in rows:
+                        self._apply(order_product_ids(products))
+                if released:
+                    rows = db.session.query(Order.products).filter(
+                        Order.id.in_(released)
+                    ).execution_options(use_primary=True).all()
+                    for products, in rows:
+                        self._apply(order_product_ids(products), sign=-1)
+        return self
+
+    def neighbours(self, product_id):
+        """Top-K [(other_id, score)] by co-occurrence normalised by popularity (cosine)"""
+        with self.lock:
+            top = self._top.get(product_id)
+            if top is None:
+                row = self.pairs.get(product_id)
+                if not row:
+                    return []
+                n = self.item_orders[product_id]
+                top = heapq.nlargest(
+                    self.top_k,
+                    ((other, count / math.sqrt(n * self.item_orders[other])) for other, count in row.items()),
+                    key=lambda pair: (pair[1], -pair[0])
+                )
+                self._top[product_id] = top
+            return top
+
+    def stats(self):
+        return {
+            'built': self.is_built,
+            'items': len(self.pairs),
+            'pairs': sum(len(row) for row in self.pairs.values()),
+            'pending_orders': len(self.pending_orders),
+            'pending_released': len(self.pending_released)
+        }
+
+
+def _released(order):
+    """True if this flush moves the order into an excluded status"""
+    history = inspect(order).attrs.status.history
+    if not history.added:
+        return False
+    before = history.deleted[0] if history.deleted else None
+    return before not in EXCLUDED_STATUSES and history.added[0] in EXCLUDED_STATUSES
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_new_orders(session, flush_context):
+    new_ids = [obj.id for obj in session.new if isinstance(obj, Order)]
+    if new_ids:
+        session.info.setdefault('new_order_ids', []).extend(new_ids)
+    released_ids = [obj.id for obj in session.dirty if isinstance(obj, Order) and _released(obj)]
+    if released_ids:
+        session.info.setdefault('released_order_ids', []).extend(released_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_new_orders(session):
+    """Announce orders only once committed, so every worker can read them"""
+    for order_id in session.info.pop('new_order_ids', []):
+        invalidations.publish('orders', order_id)
+    for order_id in session.info.pop('released_order_ids', []):
+        invalidations.publish('released_orders', order_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_new_orders(session):
+    session.info.pop('new_order_ids', None)
+    session.info.pop('released_order_ids', None)
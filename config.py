@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from app.utils.database import engine_options
 
 load_dotenv()
 
@@ -8,6 +9,9 @@ class Config:
     
     # Flask Secret Key
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+    # Signed-in users are kept in Flask's session cookie (see auth.py)
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', '').lower() in ('1', 'true', 'yes')
     
     # Database Configuration (Supabase PostgreSQL)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
@@ -20,19 +24,140 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
     
+    # Connection pool per worker process (and per database): keep
+    # (pool_size + max_overflow) x workers under the server's connection limit
+    DB_POOL = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+    }
+    # Set when connecting through PgBouncer/Supabase's pooler in transaction mode
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '').lower() in ('1', 'true', 'yes')
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))  # ignored with PgBouncer
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        SQLALCHEMY_DATABASE_URI, 'primary', DB_POOL, DB_PGBOUNCER, DB_STATEMENT_TIMEOUT_MS
+    )
+    
+    # Read replicas (comma-separated URLs); read-only queries are routed to
+    # them by app.utils.database, with the same pool settings
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    DB_REPLICA_RETRY_SECONDS = int(os.environ.get('DB_REPLICA_RETRY_SECONDS', 30))
+    
     # Cloudinary Configuration
     CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
     CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
     CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
     
+    # 3D asset pipeline; the local store stands in for Cloudinary
+    ASSET_STORE_PATH = os.environ.get('ASSET_STORE_PATH') or 'instance/assets'
+    ASSET_URL_PREFIX = '/assets'
+    ASSET_MODEL_LODS = {'lod0': 1.0, 'lod1': 0.5, 'lod2': 0.15}  # triangle ratio per level
+    ASSET_THUMBNAIL_SIZES = (320, 640)
+    ASSET_TEXTURE_MAX_SIZE = int(os.environ.get('ASSET_TEXTURE_MAX_SIZE', 2048))
+    GLTFPACK_PATH = os.environ.get('GLTFPACK_PATH') or 'gltfpack'
+    # Background asset jobs per worker; uploads beyond running + pending get a 503
+    ASSET_WORKERS = int(os.environ.get('ASSET_WORKERS', 2))
+    ASSET_MAX_PENDING = int(os.environ.get('ASSET_MAX_PENDING', 8))
+    
+    # LLM (OpenAI) Settings; LLM_BACKEND=fake uses the offline stand-in
+    LLM_BACKEND = os.environ.get('LLM_BACKEND', 'openai')
+    LLM_MODEL = os.environ.get('LLM_MODEL', 'gpt-4.1-mini')
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 30))
+    LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', 5))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))
+    LLM_RETRY_BACKOFF = float(os.environ.get('LLM_RETRY_BACKOFF', 0.5))
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+    LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', 5))
+    
+    # Chat context retrieval
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get('CHAT_CONTEXT_TOKEN_BUDGET', 300))
+    CHAT_CONTEXT_MAX_PRODUCTS = int(os.environ.get('CHAT_CONTEXT_MAX_PRODUCTS', 8))
+    
+    # LLM response cache (exact + near-duplicate prompt matching)
+    RESPONSE_CACHE_PATH = os.environ.get('RESPONSE_CACHE_PATH') or 'instance/llm_responses.sqlite3'
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 5000))
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 24 * 3600))
+    RESPONSE_CACHE_SIMILARITY = float(os.environ.get('RESPONSE_CACHE_SIMILARITY', 0.92))
+    
     # Application Settings
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_UPLOAD_MB', 64)) * 1024 * 1024  # raw GLB uploads
     PRODUCTS_PER_PAGE = 12
     RECOMMENDATIONS_LIMIT = 4
     
+    # Similarity Index (precomputed TF-IDF neighbours)
+    SIMILARITY_INDEX_PATH = os.environ.get('SIMILARITY_INDEX_PATH') or 'instance/similarity_index.pkl'
+    SIMILARITY_TOP_K = int(os.environ.get('SIMILARITY_TOP_K', 20))
+    
+    # "Customers also bought": co-purchase top-K per item, blended with TF-IDF
+    # as weight * co-purchase + (1 - weight) * similarity
+    COLLABORATIVE_TOP_K = int(os.environ.get('COLLABORATIVE_TOP_K', 20))
+    COLLABORATIVE_WEIGHT = float(os.environ.get('COLLABORATIVE_WEIGHT', 0.7))
+    
+    # Trending: time-decayed views/orders, recomputed every REFRESH_INTERVAL seconds
+    TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 24))
+    TRENDING_WINDOW_HOURS = int(os.environ.get('TRENDING_WINDOW_HOURS', 7 * 24))
+    TRENDING_REFRESH_INTERVAL = int(os.environ.get('TRENDING_REFRESH_INTERVAL', 60))
+    TRENDING_VIEW_WEIGHT = float(os.environ.get('TRENDING_VIEW_WEIGHT', 1))
+    TRENDING_ORDER_WEIGHT = float(os.environ.get('TRENDING_ORDER_WEIGHT', 10))
+    TRENDING_SIZE = int(os.environ.get('TRENDING_SIZE', 100))
+    # Held by the one worker per host that deletes expired trending buckets
+    TRENDING_PRUNE_LOCK_PATH = os.environ.get('TRENDING_PRUNE_LOCK_PATH') or 'instance/trending_prune.lock'
+    
+    # Orders: stock is reserved at placement and released if the order is
+    # not confirmed within ORDER_RESERVATION_MINUTES
+    ORDER_RESERVATION_MINUTES = float(os.environ.get('ORDER_RESERVATION_MINUTES', 15))
+    ORDER_SWEEP_INTERVAL = int(os.environ.get('ORDER_SWEEP_INTERVAL', 60))
+    ORDER_MAX_ITEMS = int(os.environ.get('ORDER_MAX_ITEMS', 50))
+    ORDER_MAX_QUANTITY = int(os.environ.get('ORDER_MAX_QUANTITY', 20))
+    # Unconfirmed orders one shopper may hold at once (0 = no limit), so a
+    # single client cannot reserve a flash sale's whole stock
+    ORDER_MAX_PENDING_PER_USER = int(os.environ.get('ORDER_MAX_PENDING_PER_USER', 3))
+    ORDER_MAX_RETRIES = int(os.environ.get('ORDER_MAX_RETRIES', 5))
+    ORDER_RETRY_BACKOFF = float(os.environ.get('ORDER_RETRY_BACKOFF', 0.02))
+    
+    # Bulk imports touching more products than this rebuild the index once
+    IMPORT_INCREMENTAL_LIMIT = int(os.environ.get('IMPORT_INCREMENTAL_LIMIT', 500))
+    
+    # Rules-based recommendations: `when` matches the viewed product,
+    # `then` selects candidates (fields: category, name, color, tags)
+    RECOMMENDATION_RULES = [
+        {
+            'name': 'dress_bags_shoes',
+            'when': {'category': ['dress'], 'name': ['فستان']},
+            'then': {'category': ['bag', 'shoe', 'شنطة', 'جزمة']}
+        },
+        {
+            'name': 'black_complementary_colors',
+            'when': {'color': ['black', 'أسود']},
+            'then': {'color': ['white', 'red', 'gold', 'أبيض', 'أحمر', 'ذهبي']}
+        },
+        {
+            'name': 'soiree_accessories',
+            'when': {'tags': ['soiree', 'evening', 'سواريه']},
+            'then': {'category': ['accessory', 'إكسسوار']}
+        },
+    ]
+    
     # Cache Settings
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300
+    RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 2048))
+    # Longest a request waits on another thread computing the same recommendations
+    SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 10))
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 512))
+    PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 600))
+    CACHE_INVALIDATION_PATH = os.environ.get('CACHE_INVALIDATION_PATH') or 'instance/cache_invalidations.log'
+    
+    # Metrics (/metrics, Prometheus text format) and the opt-in request profiler
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # require "Authorization: Bearer <token>" if set
+    # Admin endpoints (asset uploads) need "Authorization: Bearer <token>"; disabled if unset
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN')  # require X-Profile-Token if set
+    PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.005))
+    PROFILER_PATH = os.environ.get('PROFILER_PATH') or 'instance/profiles'
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -0,0 +1,229 @@
+import itertools
+import time
+import weakref
+
+from flask import current_app
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from app.utils.metrics import record_error, registry
+
+# Imported by config.py: do not import `config` or `from app import db` here
+
+
+def _normalize_url(url):
+    # Heroku/Render style postgres:// URLs
+    if url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
+def engine_options(url, name, pool, pgbouncer=False, statement_timeout_ms=0):
+    """
+    create_engine() options for one database: pool sizing from `pool`
+    (pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping)
+    and a metered pool named `name` for the db_pool_* metrics.
+    """
+    url = make_url(_normalize_url(url))
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}  # in-memory SQLite needs its single-connection pool
+
+    options = dict(pool, poolclass=MeteredQueuePool, pool_logging_name=name)
+    connect_args = {}
+    if url.get_backend_name() == 'postgresql':
+        if pgbouncer:
+            # Transaction pooling (PgBouncer / Supabase pooler on 6543) hands each
+            # transaction a different server connection: no server-side prepared
+            # statements (psycopg 3 prepares after 5 runs; psycopg2 never does),
+            # and no startup options, which PgBouncer rejects.
+            if url.get_driver_name() == 'psycopg':
+                connect_args['prepare_threshold'] = None
+        elif statement_timeout_ms:
+            connect_args['options'] = f'-c statement_timeout={statement_timeout_ms}'
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+_pools = {}  # pool name -> weakref to the live pool (engine.dispose() replaces it)
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait and how often they time out"""
+
+    def __init__(self, creator, pool_size=5, max_overflow=10, **kwargs):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kwargs)
+        self.metrics_name = self.logging_name or 'primary'
+        # max_overflow=-1 means unbounded, so there is no saturation point
+        self.capacity = pool_size + max_overflow if max_overflow >= 0 else None
+        _pools[self.metrics_name] = weakref.ref(self)
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_timeouts.inc(pool=self.metrics_name)
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start, pool=self.metrics_name)
+
+
+def _live_pools():
+    for name, ref in sorted(_pools.items()):
+        pool = ref()
+        if pool is not None:
+            yield name, pool
+
+
+def _pool_connections():
+    values = {}
+    for name, pool in _live_pools():
+        values[(name, 'checked_out')] = pool.checkedout()
+        values[(name, 'idle')] = pool.checkedin()
+        values[(name, 'overflow')] = max(pool.overflow(), 0)
+    return values
+
+
+def _pool_saturation():
+    return {
+        (name,): round(pool.checkedout() / pool.capacity, 4)
+        for name, pool in _live_pools() if pool.capacity
+    }
+
+
+pool_checkout_wait = registry.histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection', labels=('pool',),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+)
+pool_timeouts = registry.counter(
+    'db_pool_timeouts_total', 'Checkouts that gave up after pool_timeout', labels=('pool',)
+)
+pool_connections = registry.gauge(
+    'db_pool_connections', 'Pooled connections by state', labels=('pool', 'state'), fn=_pool_connections
+)
+pool_saturation = registry.gauge(
+    'db_pool_saturation', 'Checked-out connections / (pool_size + max_overflow)', labels=('pool',),
+    fn=_pool_saturation
+)
+replica_reads = registry.counter(
+    'db_replica_reads_total', 'Read-only ORM queries by the bind that served them', labels=('bind',)
+)
+
+
+class ReplicaRouter:
+    """
+    Sends read-only ORM queries to the read replicas round-robin; all
+    writes go to the primary. Reads also stay on the primary:
+      - once the session has written anything, until it is removed at the
+        end of the request/app context (read-your-writes)
+      - when autoflush is about to write pending changes first
+      - for SELECT ... FOR UPDATE
+      - for queries marked .execution_options(use_primary=True), used by
+        re-reads right after another worker's invalidation, where
+        replication lag would leave stale in-memory structures behind,
+        and by existence checks that gate a write (a row created by an
+        earlier request may not have reached the replica yet)
+    Replica engines (Config.DATABASE_REPLICA_URLS) are kept here rather
+    than in SQLALCHEMY_BINDS, so create_all() and migrations never touch
+    them; one that cannot be connected to is skipped for
+    DB_REPLICA_RETRY_SECONDS.
+    """
+
+    def __init__(self):
+        self.engines = None  # created from the app config on first use
+        self.keys = []
+        self.retry_seconds = 30
+        self._next = itertools.count()
+        self._down_until = {}
+
+    def _configure(self):
+        config = current_app.config
+        self.retry_seconds = config.get('DB_REPLICA_RETRY_SECONDS', self.retry_seconds)
+        engines = {}
+        for i, url in enumerate(config.get('DATABASE_REPLICA_URLS') or []):
+            key = f'replica_{i}'
+            options = engine_options(
+                url, key, config['DB_POOL'], config.get('DB_PGBOUNCER', False), config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+            )
+            engines[key] = create_engine(_normalize_url(url), **options)
+        self.keys = sorted(engines)
+        self.engines = engines
+
+    def dispose(self):
+        """Close pooled replica connections (before forking workers)"""
+        for engine in (self.engines or {}).values():
+            engine.dispose()
+
+    def pick(self):
+        now = time.monotonic()
+        for _ in range(len(self.keys)):
+            key = self.keys[next(self._next) % len(self.keys)]
+            if self._down_until.get(key, 0) <= now:
+                return key
+        return None
+
+    def mark_down(self, key):
+        self._down_until[key] = time.monotonic() + self.retry_seconds
+
+    def wants_primary(self, state):
+        session = state.session
+        if not state.is_select:
+            session.info['db_wrote'] = True
+            return True
+        if session.info.get('db_wrote') or state.execution_options.get('use_primary'):
+            return True
+        if session.new or session.deleted or session.dirty:
+            return True
+        # No public accessor for FOR UPDATE on a Select
+        return getattr(state.statement, '_for_update_arg', None) is not None
+
+    def route(self, state):
+        if self.engines is None:
+            self._configure()
+        if not self.keys or self.wants_primary(state):
+            if state.is_select:
+                replica_reads.inc(bind='primary')
+            return None
+        key = self.pick()
+        if key is None:
+            replica_reads.inc(bind='primary')
+            return None
+        engine = self.engines[key]
+        try:
+            result = state.invoke_statement(bind_arguments={'bind': engine})
+        except exc.DBAPIError as e:
+            # Only a failed connect is retried on the primary: nothing ran on the
+            # replica and the session holds no connection to it.
+            if e.statement is not None:
+                raise
+            current_app.logger.warning('Replica %s unavailable, reading from primary: %s', key, e)
+            record_error('replica')
+            self.mark_down(key)
+            replica_reads.inc(bind='primary')
+            return None
+        replica_reads.inc(bind=key)
+        return result
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'replicas': self.keys,
+            'down': [key for key, until in self._down_until.items() if until > now]
+        }
+
+
+# Global instance
+router = ReplicaRouter()
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _route_reads(state):
+    return router.route(state)
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_written(session, flush_context):
+    session.info['db_wrote'] = True
@@ -0,0 +1,14 @@
+import argparse
+from app import create_app
+from app.utils.catalog_io import export_file
+
+parser = argparse.ArgumentParser(description='Stream the product catalog to a CSV or JSONL file')
+parser.add_argument('path')
+parser.add_argument('--batch-size', type=int, default=1000)
+args = parser.parse_args()
+
+app = create_app()
+with app.app_context():
+    summary = export_file(args.path, batch_size=args.batch_size)
+    print(f"✅ Exported {summary['exported']} products in {summary['seconds']}s "
+          f"- {summary['rows_per_second']} rows/s")
@@ -0,0 +1,49 @@
+import os
+import random
+import time
+from types import SimpleNamespace
+
+import httpx
+from openai import APITimeoutError
+
+
+class FakeOpenAI:
+    """
+    Offline stand-in for the OpenAI client (chat.completions.create only),
+    for load tests and local development without an API key.
+
+    Tunable via environment:
+      FAKE_LLM_LATENCY       seconds before the first token (default 0.5)
+      FAKE_LLM_TOKEN_DELAY   seconds between streamed tokens (default 0.02)
+      FAKE_LLM_FAILURE_RATE  probability of a simulated timeout (default 0)
+    """
+
+    REPLY = "تمام 👌 قولي بس هتلبسيه خروج ولا شغل وأنا أظبطك على مزاجك"
+
+    def __init__(self, latency=None, token_delay=None, failure_rate=None, reply=None):
+        self.latency = float(latency if latency is not None else os.environ.get('FAKE_LLM_LATENCY', 0.5))
+        self.token_delay = float(token_delay if token_delay is not None else os.environ.get('FAKE_LLM_TOKEN_DELAY', 0.02))
+        self.failure_rate = float(failure_rate if failure_rate is not None else os.environ.get('FAKE_LLM_FAILURE_RATE', 0))
+        self.reply = reply or self.REPLY
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=None, stream=False, **kwargs):
+        if self.failure_rate and random.random() < self.failure_rate:
+            time.sleep(self.latency)
+            raise APITimeoutError(request=httpx.Request('POST', 'http://fake-llm/v1/chat/completions'))
+
+        time.sleep(self.latency)
+        if stream:
+            return self._stream()
+
+        message = SimpleNamespace(content=self.reply, role='assistant')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason='stop')])
+
+    def _stream(self):
+        words = self.reply.split(' ')
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.token_delay)
+            delta = SimpleNamespace(content=word if i == 0 else f' {word}')
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason='stop')])
@@ -0,0 +1,26 @@
+import os
+
+# Threaded workers so a slow or streaming /api/chat request holds one
+# thread, not a whole worker process.
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+
+# Import the app once in the master and fork workers from it, so modules
+# and the prebuilt recommendation index are shared copy-on-write.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app.utils.startup import loaded_heavy_modules, preload
+
+    loaded = preload(server.app.wsgi())
+    server.log.info(
+        "Preloaded similarity index: %s; heavy modules in master: %s",
+        'yes' if loaded else 'no (built on first use)', ', '.join(loaded_heavy_modules()) or 'none'
+    )
@@ -0,0 +1,17 @@
+import argparse
+from app import create_app
+from app.utils.catalog_io import import_file
+
+parser = argparse.ArgumentParser(description='Bulk upsert products from a CSV or JSONL file')
+parser.add_argument('path')
+parser.add_argument('--batch-size', type=int, default=1000)
+args = parser.parse_args()
+
+app = create_app()
+with app.app_context():
+    summary = import_file(args.path, batch_size=args.batch_size)
+    for error in summary['errors'][:20]:
+        print(f"⚠️  {error}")
+    print(f"✅ Imported {summary['upserted']}/{summary['processed']} rows "
+          f"({len(summary['errors'])} rejected) in {summary['seconds']}s "
+          f"- {summary['rows_per_second']} rows/s")
@@ -0,0 +1,135 @@
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import func, tuple_
+
+from app import db
+from app.models.product import Product
+from app.utils.cache import TTLCache, invalidations
+
+# Only what the product cards render; skips description and the JSON columns
+CARD_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.price,
+    Product.category,
+    Product.thumbnail_url,
+    Product.created_at,
+)
+
+
+def encode_cursor(created_at, product_id):
+    raw = f"{created_at.isoformat()}|{product_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) or None for a missing/malformed cursor"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, product_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), int(product_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    """A page of card rows plus opaque cursors to its neighbours"""
+
+    def __init__(self, items, next_cursor, prev_cursor, total):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def to_dict(self):
+        return {
+            'products': [
+                dict(row._asdict(), created_at=row.created_at.isoformat() if row.created_at else None)
+                for row in self.items
+            ],
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'total': self.total
+        }
+
+
+class ProductListing:
+    """
+    Newest-first catalog listing with keyset pagination on (created_at, id).
+    Every page is an index range scan of `per_page + 1` rows, however deep.
+    """
+
+    def __init__(self, count_ttl=60):
+        self._count_cache = TTLCache(maxsize=1, ttl=count_ttl)
+        invalidations.subscribe('catalog', lambda _: self._count_cache.clear())
+
+    def total(self):
+        invalidations.poll()
+        total = self._count_cache.get('total')
+        if total is None:
+            total = db.session.query(func.count(Product.id)).scalar()
+            self._count_cache.set('total', total)
+        return total
+
+    def query(self, after=None, before=None):
+        """
+        Card-column query for the page after/before a decoded cursor. Uses a
+        row-value comparison so PostgreSQL can seek the (created_at, id) index.
+        """
+        key = tuple_(Product.created_at, Product.id)
+        query = db.session.query(*CARD_COLUMNS)
+        if before:
+            return query.filter(key > tuple_(*before)) \
+                .order_by(Product.created_at.asc(), Product.id.asc())
+        if after:
+            query = query.filter(key < tuple_(*after))
+        return query.order_by(Product.created_at.desc(), Product.id.desc())
+
+    def featured_query(self, limit=6):
+        """Featured strip on the homepage"""
+        return Product.query.filter_by(featured=True).limit(limit)
+
+    def page(self, after=None, before=None, per_page=12):
+        after = decode_cursor(after)
+        before = None if after else decode_cursor(before)
+
+        query = self.query(after, before)
+        rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if before:
+            rows.reverse()
+
+        if not rows:
+            # Past either end (e.g. the last rows were deleted): link back the
+            # way we came, so the visitor is not stranded on an empty page
+            return KeysetPage(
+                [], encode_cursor(*before) if before else None, encode_cursor(*after) if after else None,
+                self.total()
+            )
+
+        first, last = rows[0], rows[-1]
+        has_next = has_more if not before else True
+        has_prev = bool(after) or (bool(before) and has_more)
+        return KeysetPage(
+            rows,
+            encode_cursor(last.created_at, last.id) if has_next else None,
+            encode_cursor(first.created_at, first.id) if has_prev else None,
+            self.total()
+        )
+
+
+# Global instance
+product_listing = ProductListing()
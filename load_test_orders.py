@@ -0,0 +1,136 @@
+import argparse
+import itertools
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description='Flash-sale load test: concurrent checkouts must never oversell')
+parser.add_argument('--products', type=int, default=5, help='sale products created for the run')
+parser.add_argument('--stock', type=int, default=100, help='starting stock per sale product')
+parser.add_argument('--orders', type=int, default=1000, help='checkout attempts in total')
+parser.add_argument('--concurrency', type=int, default=32, help='concurrent clients')
+parser.add_argument('--max-items', type=int, default=3, help='line items per order (1..N sale products)')
+parser.add_argument('--max-quantity', type=int, default=2, help='quantity per line item (1..N)')
+parser.add_argument('--url', help='drive a running server sharing this database instead of the app in-process '
+                                      '(start it with ORDER_MAX_PENDING_PER_USER=0)')
+args = parser.parse_args()
+
+os.environ.setdefault('LLM_BACKEND', 'fake')
+
+from app import create_app, db
+from app.models.product import Order, Product, RecommendationCache, TrendingEvent, User
+from app.utils.loadtest import HTTPClient, InProcessClient, percentile
+from app.utils.orders import order_service
+
+app = create_app()
+with app.app_context():
+    # Fresh sale products and one signed-in shopper per client, so earlier runs
+    # do not affect the check; removed again at the end
+    run_id = int(time.time())
+    password = secrets.token_urlsafe(16)
+    users = [
+        User(name='Load test', email=f'load-test-{run_id}-{i}@example.com')
+        for i in range(args.concurrency)
+    ]
+    for user in users:
+        user.set_password(password)
+    products = [
+        Product(name=f'Flash sale {run_id} #{i}', category='Flash sale', price=round(random.uniform(100, 1000), 2),
+                stock=args.stock)
+        for i in range(args.products)
+    ]
+    db.session.add_all(users)
+    db.session.add_all(products)
+    db.session.commit()
+    user_ids = [u.id for u in users]
+    emails = [u.email for u in users]
+    product_ids = [p.id for p in products]
+
+    try:
+        client = HTTPClient(args.url) if args.url else InProcessClient(app)
+        # Each shopper places far more orders than a real customer could hold
+        order_service.max_pending_per_user = 0
+        rng = random.Random(42)
+        bodies = []
+        for _ in range(args.orders):
+            chosen = rng.sample(product_ids, rng.randint(1, min(args.max_items, len(product_ids))))
+            bodies.append({
+                'items': [{'product_id': pid, 'quantity': rng.randint(1, args.max_quantity)} for pid in chosen]
+            })
+
+        # Clients keep cookies per thread: sign each thread in once, as its own shopper
+        shoppers = itertools.count()
+        signed_in = threading.local()
+
+        def checkout(body):
+            if not getattr(signed_in, 'done', False):
+                email = emails[next(shoppers)]
+                status, _ = client.request('POST', '/api/login', {'email': email, 'password': password})
+                if status != 200:
+                    raise RuntimeError(f'Sign-in failed for {email}: {status}')
+                signed_in.done = True
+            start = time.perf_counter()
+            status, _ = client.request('POST', '/api/orders', body)
+            return status, time.perf_counter() - start
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(checkout, bodies))
+        elapsed = time.perf_counter() - started
+
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        latencies = sorted(seconds * 1000 for _, seconds in results)
+        placed = statuses.get(201, 0)
+
+        print(f"{args.orders} checkouts x {args.concurrency} clients on {db.engine.dialect.name}, "
+              f"{args.products} products x {args.stock} stock")
+        print(f"  placed {placed}, out of stock {statuses.get(409, 0)}, busy {statuses.get(503, 0)}, "
+              f"other {args.orders - placed - statuses.get(409, 0) - statuses.get(503, 0)} {statuses}")
+        print(f"  {placed / elapsed:.1f} orders/s, {args.orders / elapsed:.1f} checkouts/s, "
+              f"p50 {percentile(latencies, 50):.1f} ms, p95 {percentile(latencies, 95):.1f} ms")
+
+        # Every unit sold must be accounted for by exactly one placed order
+        db.session.remove()
+        sold = {pid: 0 for pid in product_ids}
+        orders = db.session.query(Order.products).filter(Order.user_id.in_(user_ids)) \
+            .execution_options(use_primary=True)
+        for products_json, in orders:
+            for line in products_json:
+                sold[line['product_id']] += line['quantity']
+        failures = 0
+        stock = Product.query.filter(Product.id.in_(product_ids)).order_by(Product.id).execution_options(use_primary=True)
+        for product in stock:
+            ok = product.stock >= 0 and product.stock + sold[product.id] == args.stock
+            failures += not ok
+            print(f"  {'✅' if ok else '❌'} product {product.id}: sold {sold[product.id]}, left {product.stock}")
+
+        # Expire this run's reservations to put the stock back
+        Order.query.filter(Order.user_id.in_(user_ids), Order.status == 'pending') \
+            .update({'expires_at': datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False)
+        db.session.commit()
+        order_service.release_expired(batch_size=args.orders)
+        not_restored = Product.query.filter(Product.id.in_(product_ids), Product.stock != args.stock).count()
+        print(f"  {'✅' if not not_restored else '❌'} expired reservations restocked")
+
+        if failures or not_restored:
+            print('❌ Stock accounting is wrong')
+            sys.exit(1)
+        print('✅ No oversell')
+    finally:
+        db.session.rollback()
+        Order.query.filter(Order.user_id.in_(user_ids)).delete(synchronize_session=False)
+        TrendingEvent.query.filter(TrendingEvent.product_id.in_(product_ids)).delete(synchronize_session=False)
+        RecommendationCache.query.filter(RecommendationCache.product_id.in_(product_ids)) \
+            .delete(synchronize_session=False)
+        # Through the ORM, so the recommender and listings drop them as well
+        for product in Product.query.filter(Product.id.in_(product_ids)).execution_options(use_primary=True):
+            db.session.delete(product)
+        User.query.filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.session.commit()
@@ -0,0 +1,223 @@
+import json
+import math
+import os
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import event, func
+
+from app import db
+from app.models.product import Product
+
+SEARCH_TERMS = ['Dresses', 'Black', 'leather', 'Summer Casual', 'Gold', 'evening silk', 'فستان', 'Shoes Sport']
+CHAT_MESSAGES = [
+    'عايزة فستان سواريه أسود',
+    'ايه أحسن شنطة تليق على فستان ذهبي؟',
+    'محتاجة طقم كاجوال للصيف',
+    'عندكم جزمة رياضة مريحة؟',
+]
+
+
+class Scenario:
+    """One endpoint under load; `make_request(rng)` returns a (method, path, json body) tuple"""
+
+    def __init__(self, name, make_request):
+        self.name = name
+        self.make_request = make_request
+
+
+def default_scenarios(product_ids):
+    return [
+        Scenario('main.index', lambda rng: ('GET', '/', None)),
+        Scenario('main.search', lambda rng: ('GET', f'/search?q={rng.choice(SEARCH_TERMS)}', None)),
+        Scenario('api.recommend', lambda rng: ('GET', f'/api/recommend/{rng.choice(product_ids)}', None)),
+        Scenario('api.trending', lambda rng: ('GET', '/api/trending', None)),
+        Scenario('api.chat', lambda rng: ('POST', '/api/chat', {'message': rng.choice(CHAT_MESSAGES)})),
+    ]
+
+
+class QueryCounter:
+    """Counts SQL statements per thread (each load thread runs one request at a time)"""
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+
+class InProcessClient:
+    """Drives the app through Flask test clients; can count DB queries"""
+
+    def __init__(self, app):
+        self.app = app
+        self.queries = QueryCounter(db.engine)
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        self.queries.reset()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code, self.queries.count
+
+
+class HTTPClient:
+    """Drives a running server (e.g. gunicorn) over HTTP; query counts are unknown"""
+
+    def __init__(self, base_url, timeout=60):
+        import httpx
+        self._httpx = httpx
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._httpx.Client(base_url=self.base_url, timeout=self.timeout)
+        response = client.request(method, path, json=body)
+        return response.status_code, None
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_scenario(client, scenario, requests, concurrency, warmup=0, seed=42):
+    """Fire `requests` requests at `concurrency` and summarise latency, throughput and queries"""
+    rng = random.Random(seed)
+    calls = [scenario.make_request(rng) for _ in range(warmup + requests)]
+    for method, path, body in calls[:warmup]:
+        client.request(method, path, body)
+
+    results = []
+    lock = threading.Lock()
+
+    def fire(call):
+        started = time.perf_counter()
+        try:
+            status, queries = client.request(*call)
+        except Exception as e:
+            # A timeout or dropped connection counts as an error, not a crash
+            print(f"Error requesting {call[1]}: {e}")
+            status, queries = None, None
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            results.append((elapsed, status, queries))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fire, calls[warmup:]))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] for r in results)
+    queries = [r[2] for r in results if r[2] is not None]
+    return {
+        'requests': len(results),
+        'errors': sum(1 for r in results if r[1] is None or r[1] >= 400),
+        'rps': round(len(results) / wall, 1) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(latencies[-1], 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(client, requests=200, concurrency=8, warmup=10, scenarios=None, only=None):
+    """Run every scenario in turn; returns a JSON-serialisable result document"""
+    product_ids = [pid for pid, in db.session.query(Product.id).order_by(Product.id)]
+    catalog_size = db.session.query(func.count(Product.id)).scalar()
+    db.session.remove()
+
+    scenarios = scenarios or default_scenarios(product_ids or [1])
+    if only:
+        scenarios = [s for s in scenarios if s.name in only]
+
+    return {
+        'started_at': datetime.utcnow().isoformat(),
+        'revision': _git_revision(),
+        'catalog_size': catalog_size,
+        'database': db.engine.dialect.name,
+        'llm_backend': os.environ.get('LLM_BACKEND', 'openai'),
+        'requests': requests,
+        'concurrency': concurrency,
+        'scenarios': {
+            s.name: run_scenario(client, s, requests, concurrency, warmup=warmup) for s in scenarios
+        },
+    }
+
+
+def save_result(result, directory):
+    os.makedirs(directory, exist_ok=True)
+    stamp = result['started_at'].replace(':', '').replace('-', '').split('.')[0]
+    path = os.path.join(directory, f"{stamp}-{result['catalog_size']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def latest_result(directory, catalog_size, exclude=None):
+    """Most recent stored result for the same catalog size, or None"""
+    if not os.path.isdir(directory):
+        return None
+    for name in sorted(os.listdir(directory), reverse=True):
+        path = os.path.join(directory, name)
+        if not name.endswith('.json') or path == exclude:
+            continue
+        with open(path, encoding='utf-8') as f:
+            result = json.load(f)
+        if result.get('catalog_size') == catalog_size:
+            return result
+    return None
+
+
+def compare(current, baseline, max_regression=0.2):
+    """
+    [(scenario, metric, before, after, regressed)] for p95 latency, rps and
+    queries; a change worse than `max_regression` (fraction) is a regression.
+    """
+    rows = []
+    for name, now in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if not before:
+            continue
+        for metric, higher_is_worse in (('p95_ms', True), ('rps', False), ('queries_per_request', True)):
+            old, new = before.get(metric), now.get(metric)
+            if old is None or new is None:
+                continue
+            if higher_is_worse:
+                regressed = new > old * (1 + max_regression) if old else new > 0
+            else:
+                regressed = new < old * (1 - max_regression)
+            rows.append((name, metric, old, new, regressed))
+    return rows
@@ -127,7 +127,7 @@ function handleSearch(event) {
 // Load recommendations
 async function loadRecommendations(productId) {
     try {
-        const response = await fetch(`/api/recommend/${productId}`);
+        const response = await fetch(`/api/recommend/${productId}?fields=card`);
         const data = await response.json();
         
         const container = document.getElementById('recommendations');
@@ -199,15 +199,39 @@ document.addEventListener('DOMContentLoaded', () => {
             const typingId = addTypingIndicator();
 
             try {
-                const response = await fetch('/api/chat', {
+                const response = await fetch('/api/chat/stream', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ message })
                 });
-                const data = await response.json();
-                
-                removeTypingIndicator(typingId);
-                addMessage(data.response, 'ai');
+                if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                let bubble = null;
+
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+
+                    // Server-sent events are separated by a blank line
+                    const events = buffer.split('\n\n');
+                    buffer = events.pop();
+                    for (const event of events) {
+                        const dataLine = event.split('\n').find(line => line.startsWith('data: '));
+                        if (!dataLine || event.startsWith('event: done')) continue;
+                        const { delta } = JSON.parse(dataLine.slice(6));
+                        if (!bubble) {
+                            removeTypingIndicator(typingId);
+                            bubble = addMessage('', 'ai');
+                        }
+                        bubble.textContent += delta;
+                        aiMessages.scrollTop = aiMessages.scrollHeight;
+                    }
+                }
+                if (!bubble) throw new Error('Empty response');
             } catch (error) {
                 removeTypingIndicator(typingId);
                 addMessage('معلش حصل مشكلة صغيرة، ممكن تجربي تاني؟ 😅', 'ai');
@@ -226,6 +250,7 @@ document.addEventListener('DOMContentLoaded', () => {
         div.appendChild(innerDiv);
         aiMessages.appendChild(div);
         aiMessages.scrollTop = aiMessages.scrollHeight;
+        return innerDiv;
     }
 
     function addTypingIndicator() {
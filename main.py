@@ -1,54 +1,57 @@
-from flask import Blueprint, render_template, request, jsonify
+import os
+from flask import Blueprint, Response, abort, render_template, request, jsonify, current_app, send_from_directory
+from app.utils import metrics, profiler
 from app.models.product import Product
 from app.utils.ai_recommender import recommender
+from app.utils.assets import IMMUTABLE_MAX_AGE
+from app.utils.search import product_search
+from app.utils.listing import product_listing
+from app.utils.orders import order_service
+from app.utils.page_cache import cached_page
 
 bp = Blueprint('main', __name__)
 
+# App-wide request timing and the opt-in profiler hang off this blueprint
+metrics.instrument(bp)
+profiler.instrument(bp)
+# Expired reservations are released even if this worker never takes an order
+bp.before_app_request(order_service.ensure_started)
+
 @bp.route('/')
+@cached_page
 def index():
     """Homepage with featured products"""
-    page = request.args.get('page', 1, type=int)
-    per_page = 12
+    per_page = current_app.config.get('PRODUCTS_PER_PAGE', 12)
     
     # Get featured products
-    featured_products = Product.query.filter_by(featured=True).limit(6).all()
+    featured_products = product_listing.featured_query(6).all()
     
-    # Get all products with pagination
-    pagination = Product.query.order_by(Product.created_at.desc()).paginate(
-        page=page, 
-        per_page=per_page, 
-        error_out=False
+    # Newest products, keyset-paginated on (created_at, id)
+    listing = product_listing.page(
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=per_page
     )
     
-    products = pagination.items
-    
     return render_template('index.html', 
                          featured_products=featured_products,
-                         products=products,
-                         pagination=pagination)
+                         products=listing.items,
+                         pagination=listing)
 
 @bp.route('/search')
+@cached_page
 def search():
-    """Search products by name, category, or tags"""
+    """Search products by name, description, category, or tags"""
     query = request.args.get('q', '')
     category = request.args.get('category', '')
+    page = request.args.get('page', 1, type=int)
+    per_page = current_app.config.get('PRODUCTS_PER_PAGE', 12)
     
-    # Build query
-    search_query = Product.query
-    
-    if query:
-        search_query = search_query.filter(
-            (Product.name.ilike(f'%{query}%')) | 
-            (Product.description.ilike(f'%{query}%'))
-        )
-    
-    if category:
-        search_query = search_query.filter_by(category=category)
-    
-    products = search_query.all()
+    results = product_search.search(query, category=category, page=page, per_page=per_page)
     
     return render_template('search.html', 
-                         products=products,
+                         products=results.items,
+                         pagination=results,
                          query=query,
                          category=category)
 
@@ -58,6 +61,24 @@ def cart():
     return render_template('cart.html')
 
 @bp.route('/about')
+@cached_page
 def about():
     """About page"""
     return render_template('about.html')
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this worker"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/assets/<path:key>')
+def asset(key):
+    """Processed product assets; keys are content hashes, so cache them forever"""
+    root = os.path.abspath(current_app.config.get('ASSET_STORE_PATH', 'instance/assets'))
+    # conditional=True answers Range and If-None-Match requests (ETag from the file)
+    response = send_from_directory(root, key, conditional=True, max_age=IMMUTABLE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
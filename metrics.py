@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Gauge:
+    """Values read at scrape time from `fn() -> {label values tuple: value}`"""
+
+    def __init__(self, name, documentation, labels=(), fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.fn = fn
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        for key, value in sorted(self.fn().items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{_format_labels(names, key + (bound,))} {count}')
+                lines.append(f'{self.name}_bucket{_format_labels(names, key + ("+Inf",))} {series[-1]}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {series[-2]}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {series[-1]}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Per-process metrics in Prometheus text format. Each gunicorn worker
+    keeps its own series; scrape workers individually or aggregate by pid.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time spent in the view, by endpoint',
+    labels=('endpoint', 'method', 'status')
+)
+stage_duration = registry.histogram(
+    'request_stage_seconds',
+    'Per-request time by stage (sql, template, llm, recommender.*); stages may overlap',
+    labels=('endpoint', 'stage')
+)
+db_queries = registry.histogram(
+    'db_queries_per_request', 'SQL statements executed per request',
+    labels=('endpoint',), buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+)
+llm_calls = registry.counter('llm_calls_total', 'LLM API calls by outcome', labels=('outcome',))
+errors = registry.counter('app_errors_total', 'Errors handled with a fallback', labels=('component',))
+
+
+def _current():
+    """Timings of the request being served, or None outside a request"""
+    if not has_request_context():
+        return None
+    return g.get('_metrics')
+
+
+def record_stage(stage, seconds):
+    timings = _current()
+    if timings is not None:
+        timings['stages'][stage] += seconds
+
+
+@contextmanager
+def timed(stage):
+    """Add the block's wall time to `stage` for the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def record_error(component):
+    errors.inc(component=component)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get('_query_started')
+    if not stack:
+        return
+    started = stack.pop()
+    timings = _current()
+    if timings is not None:
+        timings['stages']['sql'] += time.perf_counter() - started
+        timings['queries'] += 1
+
+
+def _before_render(sender, template, context, **extra):
+    timings = _current()
+    if timings is not None:
+        timings['templates'].append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    timings = _current()
+    if timings is not None and timings['templates']:
+        timings['stages']['template'] += time.perf_counter() - timings['templates'].pop()
+
+
+def _start_request():
+    g._metrics = {
+        'started': time.perf_counter(),
+        'stages': defaultdict(float),
+        'queries': 0,
+        'templates': [],
+    }
+
+
+def _finish_request(response):
+    timings = g.pop('_metrics', None)
+    if timings is None:
+        return response
+    elapsed = time.perf_counter() - timings['started']
+    endpoint = request.endpoint or 'unmatched'
+
+    request_duration.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    db_queries.observe(timings['queries'], endpoint=endpoint)
+    for stage, seconds in timings['stages'].items():
+        stage_duration.observe(seconds, endpoint=endpoint, stage=stage)
+
+    server_timing = [f'total;dur={elapsed * 1000:.2f}'] + [
+        f'{stage.replace(".", "-")};dur={seconds * 1000:.2f}' for stage, seconds in timings['stages'].items()
+    ]
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = ', '.join(([existing] if existing else []) + server_timing)
+    return response
+
+
+def instrument(bp):
+    """Time every request of the app `bp` is registered on"""
+    bp.before_app_request(_start_request)
+    bp.after_app_request(_finish_request)
+    before_render_template.connect(_before_render)
+    template_rendered.connect(_after_render)
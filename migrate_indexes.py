@@ -0,0 +1,9 @@
+from app import create_app
+from app.utils.query_audit import migrate_columns, migrate_indexes
+
+app = create_app()
+with app.app_context():
+    for name in migrate_columns():
+        print(f"✅ column {name}")
+    for name in migrate_indexes():
+        print(f"✅ {name}")
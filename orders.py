@@ -0,0 +1,295 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, exc, func, select, update
+
+from app import db
+from app.models.product import Order, Product, User
+from app.utils.cache import invalidations
+from app.utils.metrics import record_error, registry, timed
+from config import Config
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = ('40001', '40P01')
+
+orders_total = registry.counter('orders_total', 'Order placement attempts by outcome', labels=('outcome',))
+
+
+class OrderError(ValueError):
+    """The order request is invalid as given"""
+
+
+class OutOfStockError(OrderError):
+    """Raised when any line item cannot be reserved; nothing is reserved"""
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Not enough stock for product(s) {', '.join(map(str, self.product_ids))}")
+
+
+class OrderLimitError(OrderError):
+    """Raised when the shopper already holds the maximum number of pending orders"""
+
+
+class OrdersBusyError(Exception):
+    """Raised when placement still conflicts after ORDER_MAX_RETRIES"""
+
+
+def _is_retryable(error):
+    orig = getattr(error, 'orig', None)
+    sqlstate = getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate', None)
+    if sqlstate in RETRYABLE_SQLSTATES:
+        return True
+    # SQLite: another writer held the database lock past the busy timeout
+    return 'database is locked' in str(orig)
+
+
+def _adjust_stock(quantities, sign):
+    """
+    One UPDATE for every product in {product_id: quantity}. Reservations
+    (sign=-1) only match rows that still have enough stock, so concurrent
+    orders can never take it below zero; returns the (id, price) rows hit.
+    """
+    products = Product.__table__
+    delta = case(quantities, value=products.c.id)
+    stmt = update(products).where(products.c.id.in_(quantities))
+    if sign < 0:
+        stmt = stmt.where(products.c.stock >= delta)
+    stmt = stmt.values(
+        stock=products.c.stock + sign * delta,
+        # Stock movements are not catalog edits (page caches, index fingerprint)
+        updated_at=products.c.updated_at
+    ).returning(products.c.id, products.c.price)
+    return db.session.execute(stmt).all()
+
+
+def _order_quantities(lines):
+    quantities = defaultdict(int)
+    for line in lines or []:
+        quantities[int(line['product_id'])] += int(line['quantity'])
+    return quantities
+
+
+class OrderService:
+    """
+    Places orders with atomic stock reservation: all line items are
+    reserved by a single conditional UPDATE (stock >= quantity) in the same
+    transaction as the order insert, so an order either gets every item or
+    nothing. Conflicts (serialization failures, deadlocks, a locked SQLite
+    file) are retried with backoff. Orders stay 'pending' until confirmed;
+    a background sweep expires them after the reservation window and puts
+    their stock back.
+    """
+
+    def __init__(self, reservation_minutes=15, sweep_interval=60, max_items=50, max_quantity=20,
+                 max_pending_per_user=3, max_retries=5, retry_backoff=0.02):
+        self.reservation = timedelta(minutes=reservation_minutes)
+        self.sweep_interval = sweep_interval
+        self.max_items = max_items
+        self.max_quantity = max_quantity
+        self.max_pending_per_user = max_pending_per_user
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.released = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _lines(self, items):
+        """Validated line items, merged per (product_id, color); max_quantity applies per product"""
+        if not isinstance(items, list) or not items:
+            raise OrderError('items are required')
+        if len(items) > self.max_items:
+            raise OrderError(f'At most {self.max_items} items per order')
+        lines = {}
+        for item in items:
+            try:
+                product_id = int(item['product_id'])
+                quantity = int(item.get('quantity', 1))
+            except (AttributeError, KeyError, TypeError, ValueError):
+                raise OrderError('Each item needs a product_id and a quantity')
+            if quantity < 1:
+                raise OrderError(f'Quantity must be between 1 and {self.max_quantity}')
+            color = item.get('color')
+            key = (product_id, color)
+            line = lines.setdefault(key, {'product_id': product_id, 'quantity': 0, 'color': color})
+            line['quantity'] += quantity
+        # Summed over colours, so splitting a product across lines does not raise the cap
+        if any(quantity > self.max_quantity for quantity in _order_quantities(lines.values()).values()):
+            raise OrderError(f'Quantity must be between 1 and {self.max_quantity}')
+        return list(lines.values())
+
+    def place(self, user_id, items):
+        """Reserve stock for every item and create a pending order, or raise"""
+        lines = self._lines(items)
+        quantities = dict(_order_quantities(lines))
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            raise OrderError('user_id is required')
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with timed('orders.place'):
+                    order = self._place_once(user_id, lines, quantities)
+            except OrderError as e:
+                db.session.rollback()
+                if isinstance(e, OutOfStockError):
+                    orders_total.inc(outcome='out_of_stock')
+                elif isinstance(e, OrderLimitError):
+                    orders_total.inc(outcome='limited')
+                else:
+                    orders_total.inc(outcome='rejected')
+                raise
+            except exc.DBAPIError as e:
+                db.session.rollback()
+                if not _is_retryable(e):
+                    orders_total.inc(outcome='failed')
+                    raise
+                if attempt == self.max_retries:
+                    orders_total.inc(outcome='busy')
+                    raise OrdersBusyError('Too many concurrent orders, try again')
+                orders_total.inc(outcome='retried')
+                delay = self.retry_backoff * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay))
+            else:
+                orders_total.inc(outcome='placed')
+                return order
+
+    def _place_once(self, user_id, lines, quantities):
+        # On the primary (the user may have signed up a moment ago), and locked
+        # on PostgreSQL so one shopper's concurrent checkouts are counted
+        # against the pending limit one at a time
+        if db.session.get(User, user_id, with_for_update=True) is None:
+            raise OrderError('Unknown user')
+
+        now = datetime.utcnow()
+        if self.max_pending_per_user:
+            pending = db.session.query(func.count(Order.id)).filter(
+                Order.user_id == user_id, Order.status == 'pending', Order.expires_at > now
+            ).execution_options(use_primary=True).scalar()
+            if pending >= self.max_pending_per_user:
+                raise OrderLimitError(
+                    f'At most {self.max_pending_per_user} unconfirmed orders at a time; '
+                    f'complete or cancel one first'
+                )
+
+        prices = dict(_adjust_stock(quantities, -1))
+        missing = set(quantities) - set(prices)
+        if missing:
+            known = {pid for pid, in db.session.query(Product.id).filter(Product.id.in_(missing))
+                     .execution_options(use_primary=True)}
+            if missing - known:
+                raise OrderError(f"Unknown product(s) {', '.join(map(str, sorted(missing - known)))}")
+            raise OutOfStockError(missing)
+
+        products = [dict(line, price=prices[line['product_id']]) for line in lines]
+        order = Order(
+            user_id=user_id,
+            products=products,
+            total_price=round(sum(line['price'] * line['quantity'] for line in products), 2),
+            status='pending',
+            expires_at=now + self.reservation,
+            created_at=now
+        )
+        db.session.add(order)
+        db.session.commit()
+        return order
+
+    def confirm(self, order_id):
+        """
+        Pending -> confirmed; False if it expired or was already handled.
+        Called by the payment flow once the order is paid, never from a
+        public route.
+        """
+        orders = Order.__table__
+        result = db.session.execute(
+            update(orders)
+            .where(orders.c.id == order_id, orders.c.status == 'pending')
+            .values(status='confirmed', expires_at=None)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def cancel(self, order_id, user_id):
+        """Cancel the user's pending or confirmed order and return its stock; False if not cancellable"""
+        return self._release(Order.id == order_id, Order.user_id == user_id,
+                             Order.status.in_(('pending', 'confirmed')), status='cancelled') == 1
+
+    def release_expired(self, batch_size=500):
+        """Expire pending orders past their reservation and restock them; returns the count"""
+        expired = select(Order.id).where(
+            Order.status == 'pending', Order.expires_at < datetime.utcnow()
+        ).limit(batch_size)
+        released = self._release(Order.id.in_(expired), Order.status == 'pending', status='expired')
+        self.released += released
+        return released
+
+    def _release(self, *criteria, status):
+        # Claiming with a conditional UPDATE means concurrent sweeps (one per
+        # worker) and confirm/cancel calls never release an order twice
+        orders = Order.__table__
+        claimed = db.session.execute(
+            update(orders).where(*criteria).values(status=status, expires_at=None)
+            .returning(orders.c.id, orders.c.products)
+        ).all()
+        quantities = defaultdict(int)
+        for _, products in claimed:
+            for product_id, quantity in _order_quantities(products).items():
+                quantities[product_id] += quantity
+        if quantities:
+            _adjust_stock(dict(quantities), +1)
+        db.session.commit()
+        # Core UPDATEs fire no ORM events: tell the co-purchase matrices directly
+        for order_id, _ in claimed:
+            invalidations.publish('released_orders', order_id)
+        return len(claimed)
+
+    def ensure_started(self):
+        """
+        Start this worker's reservation sweep. Runs before every request (see
+        main.py), so it starts with the worker's first request of any kind:
+        threads must be created after gunicorn forks, not in the master.
+        """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            app = current_app._get_current_object()
+            self._thread = threading.Thread(target=self._run, args=(app,), daemon=True, name='order-sweep')
+            self._thread.start()
+
+    def _run(self, app):
+        while True:
+            time.sleep(self.sweep_interval)
+            with app.app_context():
+                try:
+                    self.release_expired()
+                except Exception as e:
+                    print(f"Error releasing expired orders: {e}")
+                    record_error('orders')
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    def stats(self):
+        return {
+            'sweeping': self._thread is not None,
+            'released': self.released
+        }
+
+
+# Global instance
+order_service = OrderService(
+    reservation_minutes=Config.ORDER_RESERVATION_MINUTES,
+    sweep_interval=Config.ORDER_SWEEP_INTERVAL,
+    max_items=Config.ORDER_MAX_ITEMS,
+    max_quantity=Config.ORDER_MAX_QUANTITY,
+    max_pending_per_user=Config.ORDER_MAX_PENDING_PER_USER,
+    max_retries=Config.ORDER_MAX_RETRIES,
+    retry_backoff=Config.ORDER_RETRY_BACKOFF
+)
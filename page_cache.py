@@ -0,0 +1,80 @@
+import hashlib
+import threading
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import func
+
+from app import db
+from app.models.product import Product
+from app.utils.cache import TTLCache, invalidations
+from config import Config
+
+
+class CatalogVersion:
+    """
+    Per-worker catalog version, bumped on every 'catalog' invalidation
+    (Product insert/update/delete in any worker). Last-Modified is the
+    newest Product.updated_at, re-read once after each bump.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._last_modified = None
+        self._lock = threading.Lock()
+        invalidations.subscribe('catalog', self.bump)
+
+    def bump(self, *_):
+        with self._lock:
+            self.version += 1
+            self._last_modified = None
+
+    @property
+    def last_modified(self):
+        if self._last_modified is None:
+            last_update = db.session.query(func.max(Product.updated_at)).scalar()
+            self._last_modified = last_update or datetime.utcnow()
+        return self._last_modified
+
+
+catalog_version = CatalogVersion()
+page_cache = TTLCache(maxsize=Config.PAGE_CACHE_SIZE, ttl=Config.PAGE_CACHE_TIMEOUT)
+
+
+def cached_page(view):
+    """
+    Cache a rendered GET response keyed by endpoint, view args, query string
+    and catalog version; serve ETag/Last-Modified and answer 304s.
+    Only for pages that render the same for every visitor.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET':
+            return view(*args, **kwargs)
+
+        invalidations.poll()
+        key = (
+            request.endpoint,
+            tuple(sorted(kwargs.items())),
+            tuple(sorted(request.args.items(multi=True))),
+            catalog_version.version
+        )
+        entry = page_cache.get(key)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.direct_passthrough:
+                return response
+            body = response.get_data()
+            entry = (body, response.content_type, hashlib.sha1(body).hexdigest(), catalog_version.last_modified)
+            page_cache.set(key, entry)
+
+        body, content_type, etag, last_modified = entry
+        response = current_app.response_class(body, content_type=content_type)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.no_cache = True  # always revalidate, cheap with 304s
+        return response.make_conditional(request)
+
+    return wrapper
@@ -0,0 +1,75 @@
+import time
+from datetime import datetime
+
+from app import db
+from app.models.product import Product, RecommendationCache
+from app.utils.cache import invalidations
+from app.utils.catalog_io import dialect_insert
+
+
+def upsert_recommendation_cache(rows):
+    """Insert or replace RecommendationCache rows ({'product_id', 'recommended_ids'}) by product_id"""
+    now = datetime.utcnow()
+    stmt = dialect_insert(RecommendationCache.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['product_id'],
+        set_={'recommended_ids': stmt.excluded.recommended_ids, 'created_at': stmt.excluded.created_at}
+    )
+    db.session.execute(stmt, [dict(row, created_at=now) for row in rows])
+
+
+def write_recommendation_cache(recommended, batch_size=1000):
+    """
+    Upsert RecommendationCache rows ({product_id: [ids]}) in bulk, one
+    transaction per batch, so readers never see the table emptied (no
+    thundering herd on refresh).
+    """
+    product_ids = list(recommended)
+    written = 0
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        upsert_recommendation_cache([
+            {'product_id': pid, 'recommended_ids': recommended[pid]} for pid in batch
+        ])
+        db.session.commit()
+        written += len(batch)
+    return written
+
+
+def composed_recommendations(recommender, limit):
+    """Rules + similarity lists for every product, as served on a cache miss"""
+    rows = Product.query.with_entities(
+        Product.id, Product.name, Product.category, Product.color, Product.ai_tags
+    ).order_by(Product.id).all()
+    recommended = {}
+    for row in rows:
+        ids = recommender.compose_ids(row, limit)
+        if ids is not None:
+            recommended[row.id] = ids
+    return recommended
+
+
+def precompute_recommendations(recommender, workers=1, chunk_size=None):
+    """
+    Compute top-K neighbours for the whole catalog in one vectorised pass
+    (single TF-IDF fit, one sparse product per row block, argpartition per
+    row), persist the index and bulk-write the composed lists (rules first,
+    then neighbours) to RecommendationCache.
+    """
+    started = time.perf_counter()
+    if chunk_size:
+        recommender.index.chunk_size = chunk_size
+    index = recommender.rebuild_index(workers=workers)
+    recommended = composed_recommendations(recommender, index.top_k)
+    computed = time.perf_counter()
+
+    written = write_recommendation_cache(recommended)
+    invalidations.publish('recommendations')
+
+    finished = time.perf_counter()
+    return {
+        'products': len(index.ids),
+        'written': written,
+        'compute_seconds': round(computed - started, 3),
+        'write_seconds': round(finished - computed, 3)
+    }
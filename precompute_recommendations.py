@@ -0,0 +1,18 @@
+import argparse
+import os
+from app import create_app
+from app.utils.ai_recommender import recommender
+from app.utils.precompute import precompute_recommendations
+
+parser = argparse.ArgumentParser(description='Precompute recommendations for the whole catalog')
+parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                    help='processes used for the similarity row blocks')
+parser.add_argument('--chunk-size', type=int, default=1000,
+                    help='rows per sparse matrix block')
+args = parser.parse_args()
+
+app = create_app()
+with app.app_context():
+    summary = precompute_recommendations(recommender, workers=args.workers, chunk_size=args.chunk_size)
+    print(f"✅ Precomputed recommendations for {summary['products']} products "
+          f"(compute {summary['compute_seconds']}s, write {summary['write_seconds']}s)")
@@ -1,10 +1,23 @@
 from app import db
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class Product(db.Model):
     """Product model for storing clothing items"""
     __tablename__ = 'products'
+    __table_args__ = (
+        # Keyset pagination of the newest-first listing
+        db.Index('ix_products_created_at_id', 'created_at', 'id'),
+        # Featured strip and trending: only the few featured rows, newest first
+        db.Index('ix_products_featured_created_at', 'created_at',
+                 postgresql_where=db.text('featured'), sqlite_where=db.text('featured = 1')),
+        # Category fallback / rules catalog and colour filters
+        db.Index('ix_products_category_id', 'category', 'id'),
+        db.Index('ix_products_color', 'color'),
+        # Tag containment lookups (ai_tags @> '["soiree"]')
+        db.Index('ix_products_ai_tags', 'ai_tags', postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -18,14 +31,17 @@ class Product(db.Model):
     model_3d_url = db.Column(db.String(500))  # .glb file URL
     thumbnail_url = db.Column(db.String(500))  # preview image
     texture_urls = db.Column(db.JSON)  # different textures/colors
+    # Generated by the asset pipeline: {'model': {'lod0': url, ...}, 'thumbnail': {'320': url, ...}}
+    asset_variants = db.Column(db.JSON)
     
     # AI Tags for recommendations
-    ai_tags = db.Column(db.JSON)  # ['casual', 'summer', 'cotton']
+    ai_tags = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))  # ['casual', 'summer', 'cotton']
     
     # Metadata
     stock = db.Column(db.Integer, default=0)
     featured = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # NOT NULL: the listing's keyset cursor is (created_at, id)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
@@ -41,6 +57,7 @@ class Product(db.Model):
             'model_3d_url': self.model_3d_url,
             'thumbnail_url': self.thumbnail_url,
             'texture_urls': self.texture_urls or {},
+            'asset_variants': self.asset_variants or {},
             'ai_tags': self.ai_tags or [],
             'stock': self.stock,
             'featured': self.featured,
@@ -77,20 +94,44 @@ class User(db.Model):
 class Order(db.Model):
     """Order model for purchases"""
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Sweep for pending orders whose stock reservation has expired
+        db.Index('ix_orders_status_expires_at', 'status', 'expires_at'),
+        # Pending orders per shopper (ORDER_MAX_PENDING_PER_USER)
+        db.Index('ix_orders_user_id_status', 'user_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    products = db.Column(db.JSON)  # [{'product_id': 1, 'quantity': 2, 'color': 'red'}]
+    products = db.Column(db.JSON)  # [{'product_id': 1, 'quantity': 2, 'color': 'red', 'price': 450.0}]
     total_price = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(50), default='pending')  # pending, confirmed, shipped, delivered
+    status = db.Column(db.String(50), default='pending')  # pending, confirmed, shipped, delivered, cancelled, expired
+    # Stock is reserved while pending; released if not confirmed by then
+    expires_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    def to_dict(self):
+        """Convert order to dictionary"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'products': self.products or [],
+            'total_price': self.total_price,
+            'status': self.status,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
     def __repr__(self):
         return f'<Order {self.id}>'
 
 class RecommendationCache(db.Model):
     """Cache for AI recommendations"""
     __tablename__ = 'recommendation_cache'
+    __table_args__ = (
+        # One row per product; writers upsert on it (see precompute.upsert_recommendation_cache)
+        db.Index('uq_recommendation_cache_product_id', 'product_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
@@ -99,3 +140,21 @@ class RecommendationCache(db.Model):
     
     def __repr__(self):
         return f'<RecommendationCache for Product {self.product_id}>'
+
+class TrendingEvent(db.Model):
+    """Per-product view/order counts per time bucket, flushed by the trending engine"""
+    __tablename__ = 'trending_events'
+    __table_args__ = (
+        # Workers add their counts with an upsert on (product_id, bucket)
+        db.Index('uq_trending_events_product_bucket', 'product_id', 'bucket', unique=True),
+        db.Index('ix_trending_events_bucket', 'bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    bucket = db.Column(db.Integer, nullable=False)  # unix time at the start of the bucket
+    views = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TrendingEvent product {self.product_id} @ {self.bucket}>'
@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+from config import Config
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a
+    background thread. Output is in collapsed-stack format
+    ("frame;frame;frame count"), readable by flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common()) + '\n'
+
+
+def _requested():
+    if not Config.PROFILER_ENABLED:
+        return False
+    if request.args.get('profile') != '1' and request.headers.get('X-Profile') != '1':
+        return False
+    return not Config.PROFILER_TOKEN or request.headers.get('X-Profile-Token') == Config.PROFILER_TOKEN
+
+
+def _start_profile():
+    if _requested():
+        g._profiler = SamplingProfiler(threading.get_ident(), Config.PROFILER_INTERVAL).start()
+
+
+def _finish_profile(response):
+    profiler = g.pop('_profiler', None)
+    if profiler is None:
+        return response
+    profiler.stop()
+
+    os.makedirs(Config.PROFILER_PATH, exist_ok=True)
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{request.endpoint or 'unmatched'}.folded"
+    path = os.path.join(Config.PROFILER_PATH, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(profiler.collapsed())
+    response.headers['X-Profile-Path'] = path
+    response.headers['X-Profile-Samples'] = str(sum(profiler.samples.values()))
+    return response
+
+
+def instrument(bp):
+    """
+    Opt-in per-request profiling (PROFILER_ENABLED): add ?profile=1 or an
+    "X-Profile: 1" header and the stack samples are written under PROFILER_PATH.
+    """
+    bp.before_app_request(_start_profile)
+    bp.after_app_request(_finish_profile)
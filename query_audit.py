@@ -0,0 +1,225 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import exc, func, inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from app import db
+from app.models.product import Order, Product, RecommendationCache
+from app.utils.catalog_io import seed_catalog
+
+AUDITED_TABLES = ('products', 'recommendation_cache')
+# Superseded by uq_recommendation_cache_product_id
+OBSOLETE_INDEXES = ('ix_recommendation_cache_product_id',)
+# Keep the newest row per product so the unique index can be built
+DEDUPE_RECOMMENDATION_CACHE = text(
+    'DELETE FROM recommendation_cache WHERE id NOT IN '
+    '(SELECT MAX(id) FROM recommendation_cache GROUP BY product_id)'
+)
+# NULL if the index does not exist, true if an earlier CONCURRENTLY build left it INVALID
+INDEX_IS_INVALID = text(
+    'SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+    'WHERE c.relname = :name'
+)
+
+
+def _audited_indexes():
+    # Importing search attaches its expression indexes to the products table
+    import app.utils.search  # noqa: F401
+    for model in (Product, RecommendationCache, Order):
+        yield from sorted(model.__table__.indexes, key=lambda index: index.name)
+
+
+def migrate_columns():
+    """
+    Add model columns missing from existing tables (create_all only creates
+    whole tables). New columns are nullable, so this is a metadata-only change.
+    Also backfills products.created_at and makes it NOT NULL on PostgreSQL.
+    Returns the "table.column" changes that were made.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for model in (Product, RecommendationCache, Order):
+            table = model.__table__
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(f'{table.name}.{column.name}')
+
+        # Keyset pagination needs products.created_at on every row
+        backfilled = conn.execute(
+            Product.__table__.update().where(Product.created_at.is_(None))
+            .values(created_at=func.coalesce(Product.updated_at, datetime.utcnow()))
+        ).rowcount
+        if backfilled:
+            added.append(f'products.created_at (backfilled {backfilled} rows)')
+        created_at = next(c for c in inspector.get_columns('products') if c['name'] == 'created_at')
+        if created_at['nullable'] and engine.dialect.name == 'postgresql':
+            # SQLite cannot alter a column; the model keeps new rows non-null there
+            conn.execute(text('ALTER TABLE products ALTER COLUMN created_at SET NOT NULL'))
+            added.append('products.created_at NOT NULL')
+    return added
+
+
+def _create_index_concurrently(conn, index, attempts=3):
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS, first dropping an INVALID
+    leftover of a failed build, which IF NOT EXISTS would otherwise skip for
+    good. The recommendation_cache dedupe runs without a lock, so duplicates
+    written meanwhile can fail its unique build: dedupe again and retry.
+    """
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+    ddl = ddl.replace('INDEX IF NOT EXISTS', 'INDEX CONCURRENTLY IF NOT EXISTS', 1)
+    for attempt in range(attempts):
+        if conn.execute(INDEX_IS_INVALID, {'name': index.name}).scalar():
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}'))
+        try:
+            conn.execute(text(ddl))
+        except exc.IntegrityError:
+            if index.table.name != 'recommendation_cache' or attempt == attempts - 1:
+                raise
+            conn.execute(DEDUPE_RECOMMENDATION_CACHE)
+            continue
+        if not conn.execute(INDEX_IS_INVALID, {'name': index.name}).scalar():
+            return
+    raise RuntimeError(f'Index {index.name} is still invalid after {attempts} builds')
+
+
+def migrate_indexes():
+    """
+    Idempotently bring an existing database up to the model's indexes.
+    On PostgreSQL indexes are built CONCURRENTLY (no write lock) and
+    products.ai_tags is converted to JSONB for its GIN index. Duplicate
+    recommendation_cache rows are dropped before its unique index is built.
+    Returns the names of the indexes that were ensured.
+    """
+    engine = db.engine
+    ensured = []
+
+    if engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            column_type = conn.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = 'products' AND column_name = 'ai_tags'"
+            )).scalar()
+            if column_type == 'json':
+                conn.execute(text('ALTER TABLE products ALTER COLUMN ai_tags TYPE jsonb USING ai_tags::jsonb'))
+            conn.execute(DEDUPE_RECOMMENDATION_CACHE)
+            for index in _audited_indexes():
+                _create_index_concurrently(conn, index)
+                ensured.append(index.name)
+            for name in OBSOLETE_INDEXES:
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+        return ensured
+
+    with engine.begin() as conn:
+        conn.execute(DEDUPE_RECOMMENDATION_CACHE)
+        for index in _audited_indexes():
+            if index.dialect_kwargs.get('postgresql_using') == 'gin':
+                continue  # GIN / full-text indexes are PostgreSQL-only
+            conn.execute(CreateIndex(index, if_not_exists=True))
+            ensured.append(index.name)
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    return ensured
+
+
+def endpoint_queries():
+    """
+    (label, query) pairs for the hot queries issued by main.py, ai_routes.py,
+    ai_recommender.py and retrieval.py, built by the same functions the
+    endpoints call and parameterised from real rows.
+    """
+    from app.utils.ai_recommender import recommender
+    from app.utils.listing import product_listing
+    from app.utils.retrieval import retriever
+    from app.utils.search import product_search, tokenize
+    from app.utils.serializers import products_by_ids_query
+
+    total = db.session.query(func.count(Product.id)).scalar()
+    sample = Product.query.order_by(Product.created_at.desc(), Product.id.desc()).offset(total // 2).first()
+    if sample is None:
+        return []
+    ids = [sample.id, sample.id + 1, sample.id + 2]
+    deep_offset = total // 2 // 12 * 12
+    featured, newest = recommender.trending_fallback_queries('card')
+    context_featured, context_newest = retriever.fallback_queries()
+
+    queries = [
+        ('main.index featured', product_listing.featured_query(6)),
+        ('main.index listing (first page)', product_listing.query().limit(13)),
+        ('main.index listing (deep page)',
+         product_listing.query(after=(sample.created_at, sample.id)).limit(13)),
+        ('main.search empty query (deep page)', product_search.browse_query().offset(deep_offset).limit(12)),
+        ('main.search empty query in category', product_search.browse_query(sample.category).limit(12)),
+        ('ai.recommend lookup', recommender.lookup_query(sample.id).limit(1)),
+        ('ai.recommend fetch by ids', products_by_ids_query(ids)),
+        ('ai.recommend category fallback', recommender.category_query(sample, 4)),
+        ('ai.trending featured', featured.limit(8)),
+        ('ai.trending latest', newest.limit(8)),
+        ('ai.chat context', retriever.context_query(ids)),
+        ('ai.chat context featured', context_featured.limit(retriever.max_products)),
+        ('ai.chat context latest', context_newest.limit(retriever.max_products)),
+    ]
+    if db.engine.dialect.name == 'postgresql':
+        tokens = tokenize(sample.name)[:2]
+        queries.append(('main.search', product_search.postgres_query(tokens).limit(12)))
+        queries.append(('main.search (deep page)', product_search.postgres_query(tokens).offset(deep_offset).limit(12)))
+    return queries
+
+
+def _compile(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positiontup is not None:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    return str(compiled), params
+
+
+def sequential_scans(query):
+    """Tables from AUDITED_TABLES that the plan reads with a full scan"""
+    sql, params = _compile(query)
+    with db.engine.connect() as conn:
+        if db.engine.dialect.name == 'postgresql':
+            plan = conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {sql}', params).scalar()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            scans, stack = [], [plan[0]['Plan']]
+            while stack:
+                node = stack.pop()
+                if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in AUDITED_TABLES:
+                    scans.append(node['Relation Name'])
+                stack.extend(node.get('Plans', []))
+            return scans
+
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        scans = []
+        for row in rows:
+            detail = row[-1]
+            # SQLite: "SCAN products" is a full scan, "SCAN products USING INDEX ..." is not
+            parts = detail.split()
+            if len(parts) >= 2 and parts[0] == 'SCAN' and parts[1] in AUDITED_TABLES and 'USING' not in detail:
+                scans.append(parts[1])
+        return scans
+
+
+def audit_query_plans(min_rows=0):
+    """
+    Return [(label, tables scanned sequentially)] for every regressed endpoint
+    query. With `min_rows`, first tops the catalog up with synthetic products
+    and commits them: only pass it for a scratch database.
+    """
+    if min_rows:
+        seed_catalog(min_rows)
+    failures = []
+    for label, query in endpoint_queries():
+        scans = sequential_scans(query)
+        if scans:
+            failures.append((label, scans))
+    return failures
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from app.utils.cache import TTLCache
+from app.utils.search import normalize
+from config import Config
+
+_NON_WORD_RE = re.compile(r'[^\w]+', re.UNICODE)
+# Prompts that differ only in a number or a size ("مقاس 38" / "مقاس 40") look
+# alike as character n-grams but need different answers: exact match only
+_EXACT_ONLY_RE = re.compile(r'\d|مقاس|\b(?:x*s|m|x*l|size)\b', re.UNICODE)
+
+
+def normalize_prompt(prompt):
+    """Fold Arabic variants, drop punctuation/emoji and collapse whitespace"""
+    return _NON_WORD_RE.sub(' ', normalize(prompt)).strip()
+
+
+class ResponseCache:
+    """
+    LLM response cache keyed on the normalised prompt, persisted in SQLite so
+    it survives restarts and is shared by the workers on a host. Namespaces
+    opted into `semantic` lookups also match near-duplicate prompts by cosine
+    similarity of hashed character n-gram vectors (no fitting required),
+    except for prompts with numbers or sizes. Answers grounded in a
+    `context` (the products sent to the LLM) are keyed on it too, so they
+    are never served once that context changes.
+    """
+
+    def __init__(self, path, maxsize=5000, ttl=86400, similarity_threshold=0.92, reload_interval=60):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.reload_interval = reload_interval
+        self.memory = TTLCache(maxsize=min(maxsize, 1024), ttl=ttl)
+        self._vectorizer = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # namespace -> (keys, sparse matrix, responses), reloaded every reload_interval
+        self._vectors = TTLCache(maxsize=256, ttl=reload_interval)
+        self.stats_counters = {'hits': 0, 'semantic_hits': 0, 'misses': 0, 'stores': 0}
+
+    @property
+    def vectorizer(self):
+        """Built on the first semantic lookup; importing scikit-learn is slow"""
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+            self._vectorizer = HashingVectorizer(
+                analyzer='char_wb', ngram_range=(2, 4), n_features=2 ** 18, alternate_sign=False
+            )
+        return self._vectorizer
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                ' key TEXT PRIMARY KEY, namespace TEXT, prompt TEXT, response TEXT,'
+                ' created_at REAL, last_hit REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_responses_namespace ON responses (namespace)')
+            self._local.conn = conn
+        return conn
+
+    def _key(self, namespace, normalized):
+        return hashlib.sha1(f'{namespace}\x00{normalized}'.encode('utf-8')).hexdigest()
+
+    def _namespace(self, namespace, context):
+        # Entries for another context live in another namespace, so neither
+        # exact nor semantic lookups can reach them
+        if not context:
+            return namespace
+        return f"{namespace}:{hashlib.sha1(context.encode('utf-8')).hexdigest()[:16]}"
+
+    def get(self, namespace, prompt, semantic=False, context=None):
+        """Return a cached response or None"""
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return None
+        namespace = self._namespace(namespace, context)
+        key = self._key(namespace, normalized)
+
+        response = self.memory.get(key) or self._read(key)
+        if response is not None:
+            self.memory.set(key, response)
+            self.stats_counters['hits'] += 1
+            return response
+
+        if semantic and not _EXACT_ONLY_RE.search(normalized):
+            response = self._nearest(namespace, normalized)
+            if response is not None:
+                self.stats_counters['semantic_hits'] += 1
+                return response
+
+        self.stats_counters['misses'] += 1
+        return None
+
+    def set(self, namespace, prompt, response, context=None):
+        normalized = normalize_prompt(prompt)
+        if not normalized or not response:
+            return
+        namespace = self._namespace(namespace, context)
+        key = self._key(namespace, normalized)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses (key, namespace, prompt, response, created_at, last_hit)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (key, namespace, normalized, response, now, now)
+            )
+            conn.execute(
+                'DELETE FROM responses WHERE created_at < ? OR key IN ('
+                ' SELECT key FROM responses ORDER BY last_hit DESC LIMIT -1 OFFSET ?)',
+                (now - self.ttl, self.maxsize)
+            )
+        self.memory.set(key, response)
+        self.stats_counters['stores'] += 1
+
+        with self._lock:
+            entry = self._vectors.get(namespace)
+            if entry is not None:
+                from scipy import sparse
+                keys, matrix, responses = entry
+                vector = self.vectorizer.transform([normalized])
+                matrix = vector if matrix is None else sparse.vstack([matrix, vector]).tocsr()
+                self._vectors.set(namespace, (keys + [key], matrix, responses + [response]))
+
+    def _read(self, key):
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT response, created_at FROM responses WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            return None
+        with conn:
+            conn.execute('UPDATE responses SET last_hit = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def _nearest(self, namespace, normalized):
+        with self._lock:
+            entry = self._vectors.get(namespace)
+            if entry is None:
+                entry = self._load_vectors(namespace)
+        keys, matrix, responses = entry
+        if not keys:
+            return None
+        scores = (matrix @ self.vectorizer.transform([normalized]).T).toarray().ravel()
+        best = int(scores.argmax())
+        if scores[best] >= self.similarity_threshold:
+            return responses[best]
+        return None
+
+    def _load_vectors(self, namespace):
+        rows = self._connection().execute(
+            'SELECT key, prompt, response FROM responses WHERE namespace = ? AND created_at >= ?',
+            (namespace, time.time() - self.ttl)
+        ).fetchall()
+        keys = [r[0] for r in rows]
+        matrix = self.vectorizer.transform([r[1] for r in rows]) if rows else None
+        entry = (keys, matrix, [r[2] for r in rows])
+        self._vectors.set(namespace, entry)
+        return entry
+
+    def stats(self):
+        lookups = self.stats_counters['hits'] + self.stats_counters['semantic_hits'] + self.stats_counters['misses']
+        hits = self.stats_counters['hits'] + self.stats_counters['semantic_hits']
+        return dict(
+            self.stats_counters,
+            hit_rate=round(hits / lookups, 4) if lookups else 0.0
+        )
+
+
+# Global instance
+response_cache = ResponseCache(
+    Config.RESPONSE_CACHE_PATH,
+    maxsize=Config.RESPONSE_CACHE_SIZE,
+    ttl=Config.RESPONSE_CACHE_TTL,
+    similarity_threshold=Config.RESPONSE_CACHE_SIMILARITY
+)
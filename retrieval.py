@@ -0,0 +1,106 @@
+import time
+
+from app.models.product import Product
+from app.utils.ai_recommender import recommender
+from config import Config
+
+
+def estimate_tokens(text):
+    """Rough token count; Arabic averages about three characters per token"""
+    return max(1, len(text) // 3)
+
+
+class ProductRetriever:
+    """
+    Ranks products against a chat message using the recommender's TF-IDF
+    index (features from AIRecommender.get_product_features) and packs the
+    best matches into a token budget for the LLM context.
+    """
+
+    def __init__(self, recommender, token_budget=300, max_products=8):
+        self.recommender = recommender
+        self.token_budget = token_budget
+        self.max_products = max_products
+
+    def rank(self, message, limit):
+        """Product ids by cosine similarity to the message, best first"""
+        import numpy as np
+        index = self.recommender.ensure_index()
+        if not index.is_built or not message:
+            return []
+        with index.lock:
+            query = index.vectorizer.transform([message])
+            scores = (index.matrix @ query.T).toarray().ravel()
+            ids = list(index.ids)
+        matched = np.flatnonzero(scores > 0)
+        if not len(matched):
+            return []
+        k = min(limit, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [ids[i] for i in top]
+
+    def _describe(self, row):
+        parts = [f"{row.price} LE"]
+        if row.category:
+            parts.append(row.category)
+        if row.color:
+            parts.append(row.color)
+        return f"{row.name} ({', '.join(parts)})"
+
+    def _columns(self):
+        return Product.query.with_entities(Product.id, Product.name, Product.price, Product.category, Product.color)
+
+    def context_query(self, ids):
+        """Context columns for the ranked products"""
+        return self._columns().filter(Product.id.in_(ids))
+
+    def fallback_queries(self):
+        """Featured then all products, newest first; each can use an index (callers add the limit)"""
+        return (
+            self._columns().filter_by(featured=True).order_by(Product.created_at.desc()),
+            self._columns().order_by(Product.created_at.desc()),
+        )
+
+    def build_context(self, message):
+        """Return (context string, stats) with retrieval latency in milliseconds"""
+        started = time.perf_counter()
+        ranked_ids = self.rank(message, self.max_products)
+
+        if ranked_ids:
+            rows = {row.id: row for row in self.context_query(ranked_ids).all()}
+            rows = [rows[pid] for pid in ranked_ids if pid in rows]
+        else:
+            # Nothing relevant: featured products, topped up with the newest
+            rows = []
+            for fallback in self.fallback_queries():
+                if len(rows) >= self.max_products:
+                    break
+                seen = {row.id for row in rows}
+                extra = fallback.limit(self.max_products + len(seen)).all()
+                rows += [row for row in extra if row.id not in seen][:self.max_products - len(rows)]
+
+        lines, used = [], 0
+        for row in rows:
+            line = self._describe(row)
+            cost = estimate_tokens(line) + 1
+            if used + cost > self.token_budget:
+                break
+            lines.append(line)
+            used += cost
+
+        stats = {
+            'retrieval_ms': round((time.perf_counter() - started) * 1000, 2),
+            'matched': len(ranked_ids),
+            'included': len(lines),
+            'context_tokens': used
+        }
+        return ", ".join(lines), stats
+
+
+# Global instance
+retriever = ProductRetriever(
+    recommender,
+    token_budget=Config.CHAT_CONTEXT_TOKEN_BUDGET,
+    max_products=Config.CHAT_CONTEXT_MAX_PRODUCTS
+)
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import namedtuple
+
+from app.models.product import Product
+
+CatalogEntry = namedtuple('CatalogEntry', ['id', 'name', 'category', 'color', 'tags'])
+
+
+def _entry(product_id, name, category, color, tags):
+    """Lower-cased projection of a product used for rule matching"""
+    return CatalogEntry(
+        product_id,
+        (name or '').lower(),
+        (category or '').lower(),
+        (color or '').lower(),
+        frozenset(str(t).lower() for t in (tags or []))
+    )
+
+
+def _match_field(entry, field, needles):
+    if field == 'tags':
+        return not entry.tags.isdisjoint(needles)
+    if field == 'color':
+        return entry.color in needles
+    # category / name: substring match, like the old ILIKE '%x%' filters
+    value = getattr(entry, field)
+    return any(needle in value for needle in needles)
+
+
+class Rule:
+    """
+    A declarative pairing rule, e.g.
+    {'name': 'dress_bags_shoes', 'when': {'category': ['dress'], 'name': ['فستان']},
+     'then': {'category': ['bag', 'shoe']}}
+    `when` matches the source product, `then` selects candidates; each side
+    matches if any of its fields (category, name, color, tags) matches.
+    """
+
+    FIELDS = ('category', 'name', 'color', 'tags')
+
+    def __init__(self, name, when, then):
+        self.name = name
+        self.when = self._compile(when)
+        self.then = self._compile(then)
+
+    def _compile(self, spec):
+        unknown = set(spec) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Rule {self.name!r} uses unknown fields: {sorted(unknown)}")
+        return [(field, frozenset(v.lower() for v in values)) for field, values in spec.items()]
+
+    def applies_to(self, entry):
+        return any(_match_field(entry, field, needles) for field, needles in self.when)
+
+    def selects(self, entry):
+        return any(_match_field(entry, field, needles) for field, needles in self.then)
+
+
+class RulesEngine:
+    """
+    Evaluates pairing rules against a preloaded in-memory catalog.
+    Candidate lists per rule are precomputed when the catalog loads, so a
+    request only checks which rules apply and slices their candidates.
+    """
+
+    def __init__(self, rules):
+        self.rules = [Rule(r['name'], r.get('when', {}), r.get('then', {})) for r in rules]
+        self._lock = threading.Lock()
+        self._candidates = None  # rule name -> [product_id, ...]
+        self._stats = {rule.name: {'calls': 0, 'matches': 0, 'total_ms': 0.0} for rule in self.rules}
+
+    def mark_stale(self, *_):
+        self._candidates = None
+
+    def _load(self):
+        rows = Product.query.with_entities(
+            Product.id, Product.name, Product.category, Product.color, Product.ai_tags
+        ).order_by(Product.id).execution_options(use_primary=True).all()
+        catalog = [_entry(*row) for row in rows]
+        return {
+            rule.name: [entry.id for entry in catalog if rule.selects(entry)]
+            for rule in self.rules
+        }
+
+    def candidates(self):
+        candidates = self._candidates
+        if candidates is None:
+            with self._lock:
+                if self._candidates is None:
+                    self._candidates = self._load()
+                candidates = self._candidates
+        return candidates
+
+    def evaluate(self, product, limit=4):
+        """Return de-duplicated product ids recommended by the rules, in rule order"""
+        source = _entry(product.id, product.name, product.category, product.color, product.ai_tags)
+        candidates = self.candidates()
+        seen = {product.id}
+        result = []
+
+        for rule in self.rules:
+            if len(result) >= limit:
+                break
+            started = time.perf_counter()
+            matched = 0
+            if rule.applies_to(source):
+                for product_id in candidates.get(rule.name, []):
+                    if len(result) >= limit:
+                        break
+                    if product_id not in seen:
+                        seen.add(product_id)
+                        result.append(product_id)
+                        matched += 1
+            stats = self._stats[rule.name]
+            stats['calls'] += 1
+            stats['matches'] += matched
+            stats['total_ms'] += (time.perf_counter() - started) * 1000
+
+        return result
+
+    def stats(self):
+        """Per-rule evaluation counters and average time"""
+        return {
+            name: dict(s, avg_ms=round(s['total_ms'] / s['calls'], 4) if s['calls'] else 0.0)
+            for name, s in self._stats.items()
+        }
@@ -0,0 +1,273 @@
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import cast, func, literal, or_, text
+
+from app import db
+from app.models.product import Product
+from app.utils.cache import invalidations
+
+# Arabic folding: alef variants -> ا, alef maqsura -> ي, ta marbuta -> ه,
+# hamza carriers -> bare letter. Diacritics and tatweel are stripped.
+ARABIC_FOLD_FROM = 'أإآٱىئؤة'
+ARABIC_FOLD_TO = 'ااااييوه'
+ARABIC_DIACRITICS = 'ًٌٍَُِّْٰـ'
+
+_FOLD_TABLE = str.maketrans(ARABIC_FOLD_FROM, ARABIC_FOLD_TO, ARABIC_DIACRITICS)
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def sql_constant(value):
+    """
+    Inline string constant. Index expressions must be repeated token for
+    token by the queries that use them, and bound parameters would be sent
+    with casts (and regconfig cannot be rendered into the index DDL at all).
+    """
+    return text("'" + value.replace("'", "''") + "'")
+
+
+TS_CONFIG = text("'simple'::regconfig")
+
+# Field weights for the in-process ranker
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'tags': 2.0, 'description': 1.0}
+
+
+def normalize(text_value):
+    """Lower-case, fold Arabic letter variants and strip diacritics"""
+    return (text_value or '').lower().translate(_FOLD_TABLE)
+
+
+def tokenize(text_value):
+    return _TOKEN_RE.findall(normalize(text_value))
+
+
+def normalize_sql(expr):
+    """SQL equivalent of normalize() for PostgreSQL (translate drops unmatched chars)"""
+    return func.translate(
+        func.lower(expr), sql_constant(ARABIC_FOLD_FROM + ARABIC_DIACRITICS), sql_constant(ARABIC_FOLD_TO)
+    )
+
+
+def search_document_sql():
+    # Built with || rather than concat_ws(), which PostgreSQL marks STABLE and
+    # so rejects in an index expression
+    fields = [Product.name, Product.category, cast(Product.ai_tags, db.Text), Product.description]
+    document = func.coalesce(fields[0], sql_constant(''))
+    for field in fields[1:]:
+        document = document.op('||')(sql_constant(' ')).op('||')(func.coalesce(field, sql_constant('')))
+    return normalize_sql(document)
+
+
+def search_vector_sql():
+    return func.to_tsvector(TS_CONFIG, search_document_sql())
+
+
+# Expression indexes backing the PostgreSQL path; see ensure_search_indexes()
+search_vector_index = db.Index(
+    'ix_products_search_vector', search_vector_sql(), postgresql_using='gin'
+).ddl_if(dialect='postgresql')
+name_trigram_index = db.Index(
+    'ix_products_name_trgm', normalize_sql(Product.name).label('name_normalized'),
+    postgresql_using='gin', postgresql_ops={'name_normalized': 'gin_trgm_ops'}
+).ddl_if(dialect='postgresql')
+
+
+def ensure_search_indexes():
+    """Create the pg_trgm extension and search indexes if missing (PostgreSQL only)"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        search_vector_index.create(conn, checkfirst=True)
+        name_trigram_index.create(conn, checkfirst=True)
+
+
+class SearchPage:
+    """One page of search results with the attributes the templates use"""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.total / self.per_page)) if self.per_page else 1
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (num <= left_edge
+                    or self.page - left_current - 1 < num < self.page + right_current
+                    or num > self.pages - right_edge):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
+
+
+IndexSnapshot = namedtuple('IndexSnapshot', 'postings vocabulary categories recency')
+
+
+class InvertedIndex:
+    """
+    In-process inverted index used when the database is not PostgreSQL
+    (SQLite in development/tests). Rebuilt lazily after catalog changes;
+    each build is a snapshot that searches keep using while it is replaced.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None  # IndexSnapshot, or None when stale
+
+    def mark_stale(self, *_):
+        self._snapshot = None
+
+    def _build(self):
+        postings = defaultdict(lambda: defaultdict(float))
+        categories = {}
+        recency = {}
+        rows = Product.query.with_entities(
+            Product.id, Product.name, Product.category, Product.ai_tags,
+            Product.description, Product.created_at
+        ).all()
+        for product_id, name, category, tags, description, created_at in rows:
+            fields = {
+                'name': name,
+                'category': category,
+                'tags': ' '.join(str(t) for t in (tags or [])),
+                'description': description,
+            }
+            for field, value in fields.items():
+                for token in tokenize(value):
+                    postings[token][product_id] += FIELD_WEIGHTS[field]
+            categories[product_id] = category
+            recency[product_id] = created_at.timestamp() if created_at else 0.0
+        return IndexSnapshot(
+            postings={token: dict(docs) for token, docs in postings.items()},
+            vocabulary=sorted(postings),
+            categories=categories,
+            recency=recency
+        )
+
+    @staticmethod
+    def _expand(vocabulary, token):
+        """All vocabulary terms starting with `token` (as-you-type prefix match)"""
+        start = bisect_left(vocabulary, token)
+        terms = []
+        for term in vocabulary[start:]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query, category=None):
+        """Return product ids ranked by TF-IDF score; every query token must match"""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                snapshot = self._snapshot = self._build()
+        postings = snapshot.postings
+        total_docs = max(len(snapshot.categories), 1)
+
+        scores = None
+        for token in tokenize(query):
+            token_scores = defaultdict(float)
+            for term in self._expand(snapshot.vocabulary, token):
+                docs = postings[term]
+                idf = math.log(1 + total_docs / len(docs))
+                for product_id, tf in docs.items():
+                    token_scores[product_id] += tf * idf
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pid: s + token_scores[pid] for pid, s in scores.items() if pid in token_scores}
+            if not scores:
+                return []
+
+        if scores is None:
+            return []
+        if category:
+            scores = {pid: s for pid, s in scores.items() if snapshot.categories.get(pid) == category}
+        return sorted(scores, key=lambda pid: (-scores[pid], -snapshot.recency.get(pid, 0.0)))
+
+
+class ProductSearch:
+    """Ranked, paginated product search over name, description, category and ai_tags"""
+
+    def __init__(self):
+        self.fallback_index = InvertedIndex()
+        invalidations.subscribe('catalog', self.fallback_index.mark_stale)
+
+    def search(self, query, category=None, page=1, per_page=12):
+        page = max(page, 1)
+        tokens = tokenize(query)
+
+        if not tokens:
+            listing = self.browse_query(category)
+            total = listing.order_by(None).count()
+            items = listing.offset((page - 1) * per_page).limit(per_page).all()
+            return SearchPage(items, page, per_page, total)
+
+        if db.engine.dialect.name == 'postgresql':
+            return self._search_postgres(tokens, category, page, per_page)
+
+        invalidations.poll()
+        ranked_ids = self.fallback_index.search(query, category)
+        page_ids = ranked_ids[(page - 1) * per_page:page * per_page]
+        by_id = {p.id: p for p in Product.query.filter(Product.id.in_(page_ids)).all()} if page_ids else {}
+        items = [by_id[pid] for pid in page_ids if pid in by_id]
+        return SearchPage(items, page, per_page, len(ranked_ids))
+
+    def browse_query(self, category=None):
+        """Listing for an empty query: newest first, optionally in one category"""
+        listing = Product.query
+        if category:
+            listing = listing.filter_by(category=category)
+        return listing.order_by(Product.created_at.desc(), Product.id.desc())
+
+    def postgres_query(self, tokens, category=None):
+        """Matching products ordered by relevance (PostgreSQL only)"""
+        # Tokens are \w+ only, so they are safe to splice into a tsquery
+        ts_query = func.to_tsquery(TS_CONFIG, ' & '.join(f'{t}:*' for t in tokens))
+        vector = search_vector_sql()
+        normalized_query = ' '.join(tokens)
+        rank = func.ts_rank(vector, ts_query) + func.word_similarity(normalized_query, normalize_sql(Product.name))
+
+        matches = Product.query.filter(or_(
+            vector.op('@@')(ts_query),
+            literal(normalized_query).op('<%')(normalize_sql(Product.name))
+        ))
+        if category:
+            matches = matches.filter(Product.category == category)
+        return matches.order_by(rank.desc(), Product.id.desc())
+
+    def _search_postgres(self, tokens, category, page, per_page):
+        ranked = self.postgres_query(tokens, category)
+        total = ranked.order_by(None).count()
+        items = ranked.offset((page - 1) * per_page).limit(per_page).all()
+        return SearchPage(items, page, per_page, total)
+
+
+# Global instance
+product_search = ProductSearch()
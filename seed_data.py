@@ -1,56 +1,78 @@
-from app import db, create_app
-from app.models.product import Product
+import argparse
+import os
+from app import create_app
+from app.utils.cache import invalidations
+from app.utils.catalog_io import import_rows, seed_catalog
+
+# Synthetic catalog sizes used by the benchmark suite (benchmark.py)
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+parser = argparse.ArgumentParser(description='Seed the demo products, optionally plus a synthetic catalog')
+parser.add_argument('--size', choices=sorted(SIZES, key=SIZES.get),
+                    help='top the catalog up to this many synthetic products')
+parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                    help='processes used to precompute recommendations for --size')
+args = parser.parse_args()
+
+# Stable ids make re-running the seed an idempotent upsert
+products = [
+    {
+        'id': 1,
+        'name': "فستان سهرة أسود ملكي",
+        'description': "فستان سواريه أنيق جداً، خامة ليكرا مستوردة، مناسب لكل المناسبات السعيدة.",
+        'category': "Dresses",
+        'price': 1200.0,
+        'color': "Black",
+        'ai_tags': ["soiree", "evening", "elegant"],
+        'featured': True,
+        'stock': 10
+    },
+    {
+        'id': 2,
+        'name': "طقم كاجوال صيفي",
+        'description': "طقم مريح جداً للجامعة أو الخروجات اليومية، قطن 100%.",
+        'category': "Casual",
+        'price': 850.0,
+        'color': "Blue",
+        'ai_tags': ["casual", "summer", "cotton"],
+        'featured': True,
+        'stock': 15
+    },
+    {
+        'id': 3,
+        'name': "شنطة يد جلد طبيعي",
+        'description': "شنطة شيك جداً تكمل طقمك، جلد طبيعي 100% صناعة مصرية.",
+        'category': "Bags",
+        'price': 450.0,
+        'color': "Red",
+        'ai_tags': ["accessory", "leather"],
+        'featured': False,
+        'stock': 5
+    },
+    {
+        'id': 4,
+        'name': "حذاء كعب عالي ذهبي",
+        'description': "حذاء سواريه كعب عالي، مريح جداً في اللبس وشيك جداً.",
+        'category': "Shoes",
+        'price': 600.0,
+        'color': "Gold",
+        'ai_tags': ["soiree", "shoes"],
+        'featured': False,
+        'stock': 8
+    }
+]
 
 app = create_app()
 with app.app_context():
-    # Clear existing products
-    Product.query.delete()
-    
-    products = [
-        Product(
-            name="فستان سهرة أسود ملكي",
-            description="فستان سواريه أنيق جداً، خامة ليكرا مستوردة، مناسب لكل المناسبات السعيدة.",
-            category="Dresses",
-            price=1200.0,
-            color="Black",
-            ai_tags=["soiree", "evening", "elegant"],
-            featured=True,
-            stock=10
-        ),
-        Product(
-            name="طقم كاجوال صيفي",
-            description="طقم مريح جداً للجامعة أو الخروجات اليومية، قطن 100%.",
-            category="Casual",
-            price=850.0,
-            color="Blue",
-            ai_tags=["casual", "summer", "cotton"],
-            featured=True,
-            stock=15
-        ),
-        Product(
-            name="شنطة يد جلد طبيعي",
-            description="شنطة شيك جداً تكمل طقمك، جلد طبيعي 100% صناعة مصرية.",
-            category="Bags",
-            price=450.0,
-            color="Red",
-            ai_tags=["accessory", "leather"],
-            featured=False,
-            stock=5
-        ),
-        Product(
-            name="حذاء كعب عالي ذهبي",
-            description="حذاء سواريه كعب عالي، مريح جداً في اللبس وشيك جداً.",
-            category="Shoes",
-            price=600.0,
-            color="Gold",
-            ai_tags=["soiree", "shoes"],
-            featured=False,
-            stock=8
-        )
-    ]
-    
-    for p in products:
-        db.session.add(p)
-    
-    db.session.commit()
-    print("✅ Seed data added successfully!")
+    summary = import_rows(enumerate(products, start=1))
+    print(f"✅ Seed data added successfully! ({summary['upserted']} products, {summary['rows_per_second']} rows/s)")
+
+    if args.size:
+        from app.utils.ai_recommender import recommender
+
+        added = seed_catalog(SIZES[args.size])
+        invalidations.publish('catalog')
+        invalidations.publish('recommendations')
+        precomputed = recommender.refresh_cache(workers=args.workers)
+        print(f"✅ Synthetic catalog ready: {added} products added, "
+              f"{precomputed['products']} recommendations precomputed")
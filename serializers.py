@@ -0,0 +1,78 @@
+import json
+
+from flask import current_app
+
+from app import db
+from app.models.product import Product
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+# Field sets served by the JSON API; 'detail' matches Product.to_dict()
+FIELD_SETS = {
+    'card': ('id', 'name', 'price', 'category', 'thumbnail_url'),
+    'detail': (
+        'id', 'name', 'description', 'category', 'price', 'color', 'available_colors',
+        'model_3d_url', 'thumbnail_url', 'texture_urls', 'asset_variants', 'ai_tags', 'stock',
+        'featured', 'created_at'
+    ),
+}
+JSON_DEFAULTS = {'available_colors': list, 'texture_urls': dict, 'asset_variants': dict, 'ai_tags': list}
+
+
+def field_set(name):
+    """Validate a ?fields= value, defaulting to the full detail set"""
+    return name if name in FIELD_SETS else 'detail'
+
+
+def columns(fields='detail'):
+    return [Product.__table__.c[name] for name in FIELD_SETS[fields]]
+
+
+def serialize_rows(rows, fields='detail'):
+    """Turn projected rows (tuples in FIELD_SETS order) into plain dicts"""
+    names = FIELD_SETS[fields]
+    defaults = [(name, kind) for name, kind in JSON_DEFAULTS.items() if name in names]
+    has_created_at = 'created_at' in names
+    items = []
+    for row in rows:
+        item = dict(zip(names, row))
+        for name, kind in defaults:
+            if item[name] is None:
+                item[name] = kind()
+        if has_created_at and item['created_at'] is not None:
+            item['created_at'] = item['created_at'].isoformat()
+        items.append(item)
+    return items
+
+
+def fetch_products(ids, fields='detail'):
+    """Serialized products by id in the order of `ids`, one projected query"""
+    if not ids:
+        return []
+    rows = products_by_ids_query(ids, fields).all()
+    by_id = {item['id']: item for item in serialize_rows(rows, fields)}
+    return [by_id[pid] for pid in ids if pid in by_id]
+
+
+def query_products(fields='detail'):
+    """Projected query over the products table for a field set"""
+    return db.session.query(*columns(fields))
+
+
+def products_by_ids_query(ids, fields='detail'):
+    """The query fetch_products runs"""
+    return query_products(fields).filter(Product.id.in_(ids))
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """jsonify() replacement using the fast encoder when available"""
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
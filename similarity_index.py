@@ -0,0 +1,263 @@
+import os
+import pickle
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# numpy, scipy and scikit-learn are imported where they are first needed, so
+# workers that never touch recommendations do not pay for them at startup.
+
+_shared_matrix = None
+
+
+def _init_worker(matrix):
+    global _shared_matrix
+    _shared_matrix = matrix
+
+
+def top_k_block(matrix, start, stop, top_k):
+    """
+    Top-K neighbours for rows [start, stop): one sparse matrix product for
+    the block, then argpartition per row. Returns [(positions, scores), ...].
+    """
+    import numpy as np
+
+    block = (matrix[start:stop] @ matrix.T).toarray()
+    k = min(top_k, matrix.shape[0] - 1)
+    results = []
+    for offset, scores in enumerate(block):
+        scores[start + offset] = -1.0
+        if k <= 0:
+            results.append(([], []))
+            continue
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        results.append((top.tolist(), scores[top].tolist()))
+    return results
+
+
+def _top_k_block_shared(start, stop, top_k):
+    return start, top_k_block(_shared_matrix, start, stop, top_k)
+
+
+class SimilarityIndex:
+    """
+    Catalog-wide TF-IDF index with precomputed top-K neighbours per product.
+    Built once, patched on product insert/update/delete, lookups are O(K).
+    """
+
+    # Upper bound on dense cells per block product (~160MB of float64)
+    MAX_BLOCK_CELLS = 20_000_000
+
+    def __init__(self, feature_fn, top_k=20, chunk_size=1000):
+        self.feature_fn = feature_fn
+        self.top_k = top_k
+        self.chunk_size = chunk_size
+        self.lock = threading.RLock()
+        self.fingerprint = None
+        self._reset()
+
+    def _reset(self):
+        self.vectorizer = None
+        self.matrix = None  # CSR, one L2-normalised row per product
+        self.ids = []
+        self.positions = {}
+        self.neighbours = {}  # product_id -> [(neighbour_id, score), ...]
+
+    @property
+    def is_built(self):
+        return self.vectorizer is not None
+
+    def build(self, products, fingerprint=None, workers=1):
+        """
+        Fit the vectorizer once and compute neighbour lists for the whole
+        catalog; `workers` > 1 splits the row blocks across processes.
+        The new state is computed aside and swapped in under the lock in one
+        step, so lookups keep being served from the old index meanwhile.
+        """
+        state = self._compute(products, workers) if products else None
+        with self.lock:
+            self._reset()
+            self.fingerprint = fingerprint
+            if state is not None:
+                self.vectorizer, self.matrix, self.ids, self.positions, self.neighbours = state
+
+    def _compute(self, products, workers):
+        """(vectorizer, matrix, ids, positions, neighbours), or None without usable features"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        vectorizer = TfidfVectorizer(stop_words='english')
+        try:
+            matrix = vectorizer.fit_transform([self.feature_fn(p) for p in products]).tocsr()
+        except ValueError:
+            # Empty vocabulary (no usable features in the catalog)
+            return None
+
+        ids = [p.id for p in products]
+        n = len(ids)
+        rows_per_block = max(1, min(self.chunk_size, self.MAX_BLOCK_CELLS // n))
+        blocks = [(start, min(start + rows_per_block, n)) for start in range(0, n, rows_per_block)]
+        if workers > 1 and len(blocks) > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(matrix,)
+            ) as pool:
+                futures = [pool.submit(_top_k_block_shared, start, stop, self.top_k) for start, stop in blocks]
+                results = [f.result() for f in futures]
+        else:
+            results = [(start, top_k_block(matrix, start, stop, self.top_k)) for start, stop in blocks]
+
+        neighbours = {}
+        for start, rows in results:
+            for offset, (positions, scores) in enumerate(rows):
+                neighbours[ids[start + offset]] = [(ids[i], score) for i, score in zip(positions, scores)]
+        return vectorizer, matrix, ids, {pid: i for i, pid in enumerate(ids)}, neighbours
+
+    def lookup(self, product_id, limit):
+        """Return up to `limit` neighbour ids, or None if the product is not indexed"""
+        entries = self.neighbours.get(product_id)
+        if entries is None:
+            return None
+        return [nid for nid, _ in entries[:limit]]
+
+    def scores(self, product_id, candidate_ids):
+        """Cosine similarity of `product_id` to each candidate ({id: score}, unindexed ids skipped)"""
+        with self.lock:
+            pos = self.positions.get(product_id)
+            if pos is None:
+                return {}
+            known = [cid for cid in candidate_ids if cid in self.positions]
+            if not known:
+                return {}
+            rows = self.matrix[[self.positions[cid] for cid in known]]
+            values = (rows @ self.matrix[pos].T).toarray().ravel()
+        return dict(zip(known, values.tolist()))
+
+    def upsert(self, product):
+        """Insert or refresh a single product and patch affected neighbour lists"""
+        with self.lock:
+            if not self.is_built:
+                return
+
+            from scipy import sparse
+            vector = self.vectorizer.transform([self.feature_fn(product)]).tocsr()
+            pos = self.positions.get(product.id)
+            if pos is None:
+                pos = len(self.ids)
+                self.matrix = sparse.vstack([self.matrix, vector]).tocsr()
+                self.ids.append(product.id)
+                self.positions[product.id] = pos
+            else:
+                self.matrix = sparse.vstack(
+                    [self.matrix[:pos], vector, self.matrix[pos + 1:]]
+                ).tocsr()
+
+            scores = (self.matrix @ vector.T).toarray().ravel()
+            scores[pos] = -1.0
+            self.neighbours[product.id] = self._select(scores)
+
+            stale = []
+            for other_pos, other_id in enumerate(self.ids):
+                if other_id == product.id:
+                    continue
+                entries = self.neighbours.get(other_id, [])
+                was_full = len(entries) >= self.top_k
+                entries = [e for e in entries if e[0] != product.id]
+                score = float(scores[other_pos])
+
+                if len(entries) < self.top_k and not was_full:
+                    entries.append((product.id, score))
+                elif entries and score > entries[-1][1]:
+                    entries.append((product.id, score))
+                elif was_full and len(entries) < self.top_k:
+                    # We dropped an old entry and the new score does not make the cut,
+                    # so the true K-th neighbour is unknown: recompute this row.
+                    stale.append(other_pos)
+                    continue
+
+                entries.sort(key=lambda e: e[1], reverse=True)
+                self.neighbours[other_id] = entries[:self.top_k]
+
+            for other_pos in stale:
+                self._recompute(other_pos)
+
+    def remove(self, product_id):
+        """Drop a product from the matrix and from every neighbour list"""
+        with self.lock:
+            pos = self.positions.get(product_id)
+            if pos is None:
+                return
+
+            import numpy as np
+            keep = np.ones(len(self.ids), dtype=bool)
+            keep[pos] = False
+            self.matrix = self.matrix[keep]
+            del self.ids[pos]
+            self.positions = {pid: i for i, pid in enumerate(self.ids)}
+            self.neighbours.pop(product_id, None)
+
+            for other_id, entries in list(self.neighbours.items()):
+                if any(nid == product_id for nid, _ in entries):
+                    self._recompute(self.positions[other_id])
+
+    def _recompute(self, pos):
+        scores = (self.matrix @ self.matrix[pos].T).toarray().ravel()
+        scores[pos] = -1.0
+        self.neighbours[self.ids[pos]] = self._select(scores)
+
+    def _select(self, scores):
+        """Top-K positions of a score row via argpartition, best first"""
+        import numpy as np
+        k = min(self.top_k, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def save(self, path):
+        """Atomically write the index to disk"""
+        with self.lock:
+            state = {
+                'top_k': self.top_k,
+                'fingerprint': self.fingerprint,
+                'vectorizer': self.vectorizer,
+                'matrix': self.matrix,
+                'ids': self.ids,
+                'neighbours': self.neighbours,
+            }
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # A temp file per writer: several workers may rebuild at once
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                os.fchmod(f.fileno(), 0o644)  # mkstemp creates 0600
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path):
+        """Load a previously saved index; returns False if none exists or it is unreadable"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            top_k, fingerprint = state['top_k'], state['fingerprint']
+            vectorizer, matrix = state['vectorizer'], state['matrix']
+            ids, neighbours = state['ids'], state['neighbours']
+        except Exception as e:
+            # Truncated, or written by an incompatible version: treat as missing
+            # so the caller rebuilds it
+            print(f"Error loading similarity index {path}: {e}")
+            return False
+        with self.lock:
+            self.top_k = top_k
+            self.fingerprint = fingerprint
+            self.vectorizer = vectorizer
+            self.matrix = matrix
+            self.ids = ids
+            self.positions = {pid: i for i, pid in enumerate(ids)}
+            self.neighbours = neighbours
+        return True
@@ -0,0 +1,38 @@
+import gc
+import sys
+
+from app import db
+
+# Modules that must not be imported just to boot a worker
+HEAVY_MODULES = ('numpy', 'scipy', 'sklearn', 'pandas', 'openai', 'httpx')
+
+
+def loaded_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def preload(app):
+    """
+    Run in the gunicorn master (preload_app) before workers are forked:
+    load the prebuilt recommendation index so every worker shares its pages
+    copy-on-write, then drop DB connections the children must not inherit.
+    Everything else (LLM client, vectorizers, trending) stays lazy.
+    """
+    from app.utils.ai_recommender import recommender
+    from app.utils.database import router
+
+    with app.app_context():
+        try:
+            loaded = recommender.preload_index()
+        except Exception as e:
+            print(f"Error preloading similarity index: {e}")
+            loaded = False
+        finally:
+            db.session.remove()
+            db.engine.dispose()
+            router.dispose()
+
+    # Keep the collector from touching (and so copying) preloaded objects
+    gc.collect()
+    gc.freeze()
+    return loaded
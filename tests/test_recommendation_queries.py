@@ -0,0 +1,95 @@
+import os
+import tempfile
+
+import pytest
+
+# A throwaway SQLite database and instance files; must be set before the app is imported
+_tmp = tempfile.mkdtemp(prefix='recommendation-queries-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ['DATABASE_REPLICA_URLS'] = ''
+os.environ['LLM_BACKEND'] = 'fake'
+os.environ['SIMILARITY_INDEX_PATH'] = os.path.join(_tmp, 'similarity_index.pkl')
+os.environ['CACHE_INVALIDATION_PATH'] = os.path.join(_tmp, 'cache_invalidations.log')
+os.environ['RESPONSE_CACHE_PATH'] = os.path.join(_tmp, 'llm_responses.sqlite3')
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models.product import RecommendationCache  # noqa: E402
+from app.utils.ai_recommender import recommender  # noqa: E402
+from app.utils.catalog_io import import_rows, synthetic_rows  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app()
+    with app.app_context():
+        import_rows(synthetic_rows(300))
+        yield app
+
+
+@pytest.fixture
+def count_queries(app):
+    """Run the uncached pipeline for a product and return how many statements it sent"""
+    # One-off loads after a catalog change are not part of the per-request budget
+    recommender.ensure_index()
+    recommender.rules.candidates()
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+
+    def run(product_id):
+        db.session.remove()
+        recommender.memory_cache.clear()
+        statements.clear()
+        result = recommender._recommend_by_similarity(product_id, 4)
+        return result, len(statements)
+
+    yield run
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def test_cache_miss_is_three_queries(count_queries):
+    RecommendationCache.query.filter_by(product_id=5).delete()
+    db.session.commit()
+
+    result, queries = count_queries(5)
+
+    assert len(result) == 4
+    # product + cache row, product fetch, cache write
+    assert queries == 3
+
+
+def test_cache_hit_is_two_queries(count_queries):
+    count_queries(6)  # miss: writes the cache row
+
+    result, queries = count_queries(6)
+
+    assert len(result) == 4
+    # product + cache row, product fetch
+    assert queries == 2
+
+
+def test_category_fallback_is_two_queries(count_queries, monkeypatch):
+    # Not indexed and no rule applies
+    monkeypatch.setattr(recommender.rules, 'evaluate', lambda product, limit=4: [])
+    monkeypatch.setattr(recommender.index, 'lookup', lambda product_id, limit: None)
+    RecommendationCache.query.filter_by(product_id=7).delete()
+    db.session.commit()
+
+    result, queries = count_queries(7)
+
+    assert result
+    # product + cache row, category query
+    assert queries == 2
+
+
+def test_unknown_product_is_one_query(count_queries):
+    result, queries = count_queries(999999)
+
+    assert result == []
+    assert queries == 1
@@ -0,0 +1,233 @@
+import fcntl
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.product import Order, Product, TrendingEvent
+from app.utils.catalog_io import dialect_insert
+from app.utils.collaborative import EXCLUDED_STATUSES, order_product_ids
+from app.utils.metrics import record_error
+from config import Config
+
+BUCKET_SECONDS = 3600
+
+
+class TrendingEngine:
+    """
+    Time-decayed popularity from product views and orders. Each worker
+    counts events in memory, and on a schedule (not per request) adds them
+    to hourly TrendingEvent buckets, then re-ranks from the shared buckets
+    with one aggregate query:
+
+        score = sum(weight * count * 0.5 ** (age / half_life))
+
+    The ranking is a plain list of product ids, best first, ties broken by id.
+    Expired buckets are deleted by whichever worker holds the prune lock.
+    """
+
+    def __init__(self, half_life_hours=24, window_hours=168, refresh_interval=60,
+                 view_weight=1.0, order_weight=10.0, size=100, prune_lock_path='instance/trending_prune.lock'):
+        self.half_life = half_life_hours * 3600
+        self.window = window_hours * 3600
+        self.refresh_interval = refresh_interval
+        self.view_weight = view_weight
+        self.order_weight = order_weight
+        self.size = size
+        self.prune_lock_path = prune_lock_path
+        self.ranked = []
+        self.refreshed_at = None
+        self._views = defaultdict(int)
+        self._orders = defaultdict(int)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._prune_lock = None
+        self._pruned_at = None
+
+    def record_view(self, product_id):
+        with self._lock:
+            self._views[product_id] += 1
+
+    def record_order(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._orders[product_id] += 1
+
+    def flush(self):
+        """Add this worker's pending counts to the current bucket (atomic increments)"""
+        with self._lock:
+            views, self._views = self._views, defaultdict(int)
+            orders, self._orders = self._orders, defaultdict(int)
+        product_ids = set(views) | set(orders)
+        if not product_ids:
+            return 0
+
+        # Skip ids that do not exist (views are reported by the browser)
+        existing = {pid for pid, in db.session.query(Product.id).filter(Product.id.in_(product_ids))}
+        bucket = int(time.time()) // BUCKET_SECONDS * BUCKET_SECONDS
+        rows = [
+            {'product_id': pid, 'bucket': bucket, 'views': views.get(pid, 0), 'orders': orders.get(pid, 0)}
+            for pid in sorted(existing)
+        ]
+        if not rows:
+            return 0
+
+        table = TrendingEvent.__table__
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['product_id', 'bucket'],
+            set_={'views': table.c.views + stmt.excluded.views, 'orders': table.c.orders + stmt.excluded.orders}
+        )
+        try:
+            db.session.execute(stmt, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Keep the counts for the next attempt
+            with self._lock:
+                for pid, count in views.items():
+                    self._views[pid] += count
+                for pid, count in orders.items():
+                    self._orders[pid] += count
+            raise
+        return len(rows)
+
+    def refresh(self):
+        """Flush, drop expired buckets (one worker) and re-rank the window in SQL"""
+        with self._refresh_lock:
+            self.flush()
+            now = time.time()
+            cutoff = int(now - self.window)
+            self.prune(cutoff)
+            self.ranked = [pid for pid, in db.session.execute(self.ranking_query(now, cutoff))]
+            self.refreshed_at = now
+            return self.ranked
+
+    def ranking_query(self, now, cutoff):
+        """
+        Top `size` product ids by decayed score, best first, ties broken by id.
+        Buckets are hourly, so the decay is a CASE over the window's buckets
+        rather than a power() call, which SQLite may not have.
+        """
+        first = cutoff // BUCKET_SECONDS * BUCKET_SECONDS
+        decay = case(
+            {bucket: 0.5 ** ((now - bucket) / self.half_life)
+             for bucket in range(first, int(now) + 1, BUCKET_SECONDS)},
+            value=TrendingEvent.bucket,
+            else_=0.0
+        )
+        scores = (
+            select(
+                TrendingEvent.product_id,
+                func.sum(
+                    (self.view_weight * TrendingEvent.views + self.order_weight * TrendingEvent.orders) * decay
+                ).label('score')
+            )
+            .where(TrendingEvent.bucket >= cutoff)
+            .group_by(TrendingEvent.product_id)
+            .subquery()
+        )
+        return (
+            select(scores.c.product_id)
+            .where(scores.c.score > 0)
+            .order_by(scores.c.score.desc(), scores.c.product_id)
+            .limit(self.size)
+        )
+
+    def prune(self, cutoff):
+        """Delete expired buckets, at most hourly and only in the worker holding the prune lock"""
+        if self._pruned_at is not None and time.monotonic() - self._pruned_at < BUCKET_SECONDS:
+            return
+        if not self._owns_pruning():
+            return
+        TrendingEvent.query.filter(TrendingEvent.bucket < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        self._pruned_at = time.monotonic()
+
+    def _owns_pruning(self):
+        """Take (and keep for the life of the process) a non-blocking flock on the prune lock file"""
+        if self._prune_lock is None:
+            directory = os.path.dirname(self.prune_lock_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            f = open(self.prune_lock_path, 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            self._prune_lock = f
+        return True
+
+    def top(self, limit):
+        """Current ranking; empty until the first background refresh has run"""
+        self.ensure_started()
+        return self.ranked[:limit]
+
+    def ensure_started(self):
+        """Start this worker's refresh thread; it ranks right away, then every refresh_interval"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            app = current_app._get_current_object()
+            self._thread = threading.Thread(target=self._run, args=(app,), daemon=True, name='trending-refresh')
+            self._thread.start()
+
+    def _run(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing trending: {e}")
+                    record_error('trending')
+                finally:
+                    db.session.remove()
+            time.sleep(self.refresh_interval)
+
+    def stats(self):
+        return {
+            'ranked': len(self.ranked),
+            'refreshed_at': self.refreshed_at,
+            'pending_views': sum(self._views.values()),
+            'pending_orders': sum(self._orders.values())
+        }
+
+
+# Global instance
+trending = TrendingEngine(
+    half_life_hours=Config.TRENDING_HALF_LIFE_HOURS,
+    window_hours=Config.TRENDING_WINDOW_HOURS,
+    refresh_interval=Config.TRENDING_REFRESH_INTERVAL,
+    view_weight=Config.TRENDING_VIEW_WEIGHT,
+    order_weight=Config.TRENDING_ORDER_WEIGHT,
+    size=Config.TRENDING_SIZE,
+    prune_lock_path=Config.TRENDING_PRUNE_LOCK_PATH
+)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_order_items(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Order) and obj.status not in EXCLUDED_STATUSES:
+            session.info.setdefault('trending_order_items', []).append(order_product_ids(obj.products))
+
+
+@event.listens_for(Session, 'after_commit')
+def _count_order_items(session):
+    # Counted only by the worker that placed the order, once committed
+    for product_ids in session.info.pop('trending_order_items', []):
+        trending.record_order(product_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_order_items(session):
+    session.info.pop('trending_order_items', None)